@@ -0,0 +1,147 @@
+import asyncio
+import os
+
+from api import metrics
+from api.log import get_logger, SAMPLED
+from api.rate_limit import acquire_or_wait_seconds
+from api.smtp_pool import SMTP_HOST, SMTP_PORT, SMTP_SECURITY, SMTP_TIMEOUT, SMTP_MAX_MESSAGES_PER_CONNECTION
+
+# Optional asyncio delivery engine for check_and_send_reminders.
+#
+# Enabled with EMAIL_DELIVERY_MODE=async (requires the aiosmtplib package).
+# Every sender account gets up to ASYNC_SMTP_PER_SENDER_CONCURRENCY workers,
+# each holding one authenticated connection and draining that sender's queue,
+# while ASYNC_SMTP_CONCURRENCY caps the number of sends in flight overall.
+# Everything runs on one event loop, so thousands of messages can be pushed
+# per tick without growing the thread count.
+
+try:
+    import aiosmtplib
+except ImportError:
+    aiosmtplib = None
+
+EMAIL_DELIVERY_MODE = os.environ.get('EMAIL_DELIVERY_MODE', 'threads').lower()
+ASYNC_SMTP_CONCURRENCY = int(os.environ.get('ASYNC_SMTP_CONCURRENCY', 100))
+ASYNC_SMTP_PER_SENDER_CONCURRENCY = int(os.environ.get('ASYNC_SMTP_PER_SENDER_CONCURRENCY', 3))
+
+log = get_logger('async_delivery')
+
+
+def async_delivery_enabled():
+    if EMAIL_DELIVERY_MODE != 'async':
+        return False
+    if aiosmtplib is None:
+        log.warning("⚠️ EMAIL_DELIVERY_MODE=async but aiosmtplib is not installed, using threaded delivery")
+        return False
+    return True
+
+
+class _SenderConnection:
+    def __init__(self, sender_email, app_password):
+        self.sender_email = sender_email
+        self.app_password = app_password
+        self.smtp = None
+        self.sent = 0
+
+    async def _open(self):
+        self.smtp = aiosmtplib.SMTP(hostname=SMTP_HOST, port=SMTP_PORT, use_tls=SMTP_SECURITY == 'ssl',
+                                    start_tls=SMTP_SECURITY == 'starttls', timeout=SMTP_TIMEOUT)
+        with metrics.timer('smtp_operation_seconds', operation='connect'):
+            await self.smtp.connect()
+        with metrics.timer('smtp_operation_seconds', operation='login'):
+            await self.smtp.login(self.sender_email, self.app_password)
+        self.sent = 0
+
+    async def close(self):
+        if self.smtp is not None:
+            try:
+                await self.smtp.quit()
+            except Exception:
+                pass
+            self.smtp = None
+
+    async def send(self, receiver_email, message):
+        if self.smtp is None or self.sent >= SMTP_MAX_MESSAGES_PER_CONNECTION:
+            await self.close()
+            await self._open()
+        try:
+            with metrics.timer('smtp_operation_seconds', operation='send'):
+                await self.smtp.sendmail(self.sender_email, [receiver_email], message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # Reconnect once, as the threaded pool does
+            self.smtp = None
+            await self._open()
+            await self.smtp.sendmail(self.sender_email, [receiver_email], message)
+        self.sent += 1
+
+
+async def _sender_worker(sender_email, app_password, queue, global_limit, results):
+    from api.email_service import build_reminder_message
+
+    conn = _SenderConnection(sender_email, app_password)
+    try:
+        while True:
+            try:
+                reminder, recipient_email, reminder_time, user = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            # The rate check may wait on the SQLite lock; keep that off the event loop
+            wait = await asyncio.to_thread(acquire_or_wait_seconds, sender_email)
+            if wait:
+                # Over the sender's budget: defer this and everything left in its queue
+                results.append((reminder, recipient_email, wait))
+                while not queue.empty():
+                    item = queue.get_nowait()
+                    results.append((item[0], item[1], wait))
+                break
+            msg = build_reminder_message(sender_email, recipient_email, reminder.title,
+                                         reminder.description, reminder_time)
+            async with global_limit:
+                try:
+                    await conn.send(recipient_email, msg)
+                    log.debug("✅ Email sent successfully to %s", recipient_email, extra=SAMPLED)
+                    results.append((reminder, recipient_email, True))
+                except Exception as e:
+                    log.warning("❌ Error sending email to %s: %s", recipient_email, e)
+                    await conn.close()
+                    results.append((reminder, recipient_email, e))
+    finally:
+        await conn.close()
+
+
+async def _deliver(batches):
+    global_limit = asyncio.Semaphore(ASYNC_SMTP_CONCURRENCY)
+    results = []
+    workers = []
+    for batch in batches:
+        user = batch[0][3]
+        queue = asyncio.Queue()
+        for item in batch:
+            queue.put_nowait(item)
+        for _ in range(min(ASYNC_SMTP_PER_SENDER_CONCURRENCY, len(batch))):
+            workers.append(_sender_worker(user.email_credentials, user.app_password, queue, global_limit, results))
+    await asyncio.gather(*workers)
+    return results
+
+
+def deliver_reminders_async(batches):
+    """Send batches of (reminder, recipient_email, reminder_time, user) grouped by sender.
+
+    Returns (sent_ids, {reminder_id: error}, {reminder_id: defer_seconds}) once
+    the event loop has finished, the same shape as send_reminder_batch.
+    """
+    results = asyncio.run(_deliver(batches))
+    sent_ids = []
+    failures = {}
+    deferred = {}
+    for reminder, recipient_email, outcome in results:
+        if outcome is True:
+            sent_ids.append(reminder.id)
+            log.debug("✅ Reminder '%s' sent to %s", reminder.title, recipient_email, extra=SAMPLED)
+        elif isinstance(outcome, Exception):
+            failures[reminder.id] = outcome
+            log.warning("❌ Failed to send reminder '%s' to %s", reminder.title, recipient_email,
+                        extra={'reminder_id': reminder.id})
+        else:
+            deferred[reminder.id] = outcome
+    return sent_ids, failures, deferred
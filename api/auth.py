@@ -2,15 +2,16 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash
 from flask_mail import Mail, Message
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import os
 import sys
 
 # Add project directory to path for imports when running as script
 sys.path.insert(0, 'py-project')
 
+from api import metrics
+from api.rate_limit import acquire_or_wait_seconds
+from api.email_templates import render
+from api.email_service import send_password_reset_email, send_test_email
 from api.csv_handler import add_user, get_user_by_email, get_user_by_id, verify_password, generate_verification_token, set_verification_token, verify_email, generate_reset_token, set_reset_token, reset_password, update_user_email_credentials
 
 # System email credentials (loaded inside functions for dynamic updates)
@@ -26,9 +27,15 @@ def send_verification_email(email, token):
     else:
         domain = f"https://{domain}"  # Vercel uses https
     verify_url = f"{domain}/verify?token={token}"
-    msg = Message('Verify Your Email', sender=current_app.config['MAIL_DEFAULT_SENDER'], recipients=[email])
-    msg.body = f'Click the link to verify your email: {verify_url}'
+    subject, body = render('verify_email', verify_url=verify_url)
+    msg = Message(subject, sender=current_app.config['MAIL_DEFAULT_SENDER'], recipients=[email])
+    msg.body = body
+    sender = current_app.config.get('MAIL_USERNAME') or current_app.config['MAIL_DEFAULT_SENDER']
     try:
+        wait = acquire_or_wait_seconds(sender)
+        if wait:
+            print(f"⏭️ Verification email to {email} deferred {wait:.0f}s - {sender} is over its sending budget")
+            return False
         mail.send(msg)
         return True
     except Exception as e:
@@ -36,91 +43,11 @@ def send_verification_email(email, token):
         return False
 
 def send_reset_email(email, token, user_name='User'):
-    try:
-        SYSTEM_SENDER_EMAIL = os.environ.get('SYSTEM_SENDER_EMAIL')
-        SYSTEM_APP_PASSWORD = os.environ.get('SYSTEM_APP_PASSWORD')
-
-        msg = MIMEMultipart()
-        msg["From"] = SYSTEM_SENDER_EMAIL or "noreply@reminderapp.local"
-        msg["To"] = email
-        msg["Subject"] = "Password Reset for Reminder App"
-
-        base_url = os.environ.get('BASE_URL', 'http://localhost:5000')
-        reset_link = f"{base_url.rstrip('/')}/reset-password?token={token}"
-        body = f"""
-        Hello {user_name},
-
-        You requested a password reset for your Reminder App account.
-
-        Click the link below to reset your password:
-        {reset_link}
-
-        This link will expire in 1 hour.
-
-        If you didn't request this, please ignore this email.
-
-        ---
-        This is an automated email from the Reminder App.
-        """
-
-        msg.attach(MIMEText(body, "plain"))
-
-        if SYSTEM_SENDER_EMAIL and SYSTEM_APP_PASSWORD:
-            # Use Gmail SMTP
-            server = smtplib.SMTP_SSL("smtp.gmail.com", 465)
-            server.login(SYSTEM_SENDER_EMAIL, SYSTEM_APP_PASSWORD)
-            server.sendmail(SYSTEM_SENDER_EMAIL, email, msg.as_string())
-            server.quit()
-            print(f"✅ Password reset email sent to {email}")
-        else:
-            # Fallback for development: log email content to console
-            print("⚠️ System email credentials not set, logging email content for development")
-            print(f"   SYSTEM_SENDER_EMAIL: {'set' if SYSTEM_SENDER_EMAIL else 'not set'}")
-            print(f"   SYSTEM_APP_PASSWORD: {'set' if SYSTEM_APP_PASSWORD else 'not set'}")
-            print(f"📧 Password reset email for {email}:")
-            print(f"Subject: {msg['Subject']}")
-            print(f"Body:\n{body}")
-            print(f"Reset Link: {reset_link}")
-            print("✅ Password reset email logged (copy the link above to reset password)")
-
-        return True
-
-    except Exception as e:
-        print(f"❌ Error sending password reset email to {email}: {e}")
-        return False
+    return send_password_reset_email(email, token, user_name)
 
 def send_verification_email_to_credentials(email, app_password):
-    try:
-        msg = MIMEMultipart()
-        msg["From"] = email
-        msg["To"] = email
-        msg["Subject"] = "Email Credentials Verification"
-
-        body = """
-        Hello!
-
-        This is a test email from the Reminder App to verify your email credentials are working correctly.
-
-        If you received this email, your settings are configured properly.
-
-        ---
-        This is an automated test email from the Reminder App.
-        """
-
-        msg.attach(MIMEText(body, "plain"))
-
-        # Use user provided credentials to send the email
-        server = smtplib.SMTP_SSL("smtp.gmail.com", 465)
-        server.login(email, app_password)
-        server.sendmail(email, email, msg.as_string())
-        server.quit()
-
-        print(f"✅ Verification email sent to {email}")
-        return True
-
-    except Exception as e:
-        print(f"❌ Error sending verification email to {email}: {e}")
-        return False
+    # Sent from and to the user's own account
+    return send_test_email(email, app_password, email, template='credentials_verification')
 
 class User:
     def __init__(self, id, email, password_hash):
@@ -172,9 +99,9 @@ def forgot_password():
             token = generate_reset_token(email)
             from datetime import datetime, timedelta
             expiry = datetime.now() + timedelta(hours=1)
-            set_reset_token(user_data['id'], token, expiry)
+            set_reset_token(user_data.id, token, expiry)
             try:
-                send_reset_email(email, token, user_data.get('name', 'User'))
+                send_reset_email(email, token, 'User')
                 flash('If the email exists, a reset link has been sent.', 'info')
             except Exception as e:
                 flash('Password reset unsuccessful - email not sent.', 'error')
@@ -192,16 +119,18 @@ def login():
 
         user_data = get_user_by_email(email)
 
-        if user_data and verify_password(password, user_data['password_hash']):
+        if user_data and verify_password(password, user_data.password_hash):
             user = User(
-                id=user_data['id'],
-                email=user_data['email'],
-                password_hash=user_data['password_hash']
+                id=user_data.id,
+                email=user_data.email,
+                password_hash=user_data.password_hash
             )
 
             login_user(user)
+            metrics.inc('login_attempts_total', result='success')
             return redirect(url_for('reminders.dashboard'))
         else:
+            metrics.inc('login_attempts_total', result='failure')
             flash('Invalid email or password', 'error')
 
     return render_template('login.html')
@@ -269,7 +198,7 @@ def profile():
         confirm_password = request.form.get('confirm_password')
 
         if current_password and new_password and confirm_password:
-            if not user_data or not verify_password(current_password, user_data['password_hash']):
+            if not user_data or not verify_password(current_password, user_data.password_hash):
                 flash('Current password is incorrect.', 'error')
                 return render_template('profile.html', user=user_data)
 
@@ -315,10 +244,10 @@ def email_credentials():
 def send_verification_email():
     from api.csv_handler import get_user_by_id
     user_data = get_user_by_id(current_user.get_id())
-    if user_data and user_data.get('email_credentials') and user_data.get('app_password'):
-        app_password = user_data['app_password']
+    if user_data and user_data.email_credentials and user_data.app_password:
+        app_password = user_data.app_password
         try:
-            send_verification_email_to_credentials(user_data['email_credentials'], app_password)
+            send_verification_email_to_credentials(user_data.email_credentials, app_password)
             flash('Verification email sent to your email credentials.', 'success')
         except Exception as e:
             flash('Failed to send verification email.', 'error')
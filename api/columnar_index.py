@@ -0,0 +1,136 @@
+import os
+
+from api.log import get_logger
+
+# Columnar due-reminder index backed by NumPy (REMINDER_DUE_INDEX=numpy).
+#
+# Drop-in alternative to DueIndex for installs with millions of reminders.
+# Every row of the reminders table owns one slot in a set of parallel arrays:
+# reminder_time as int64 epoch seconds, is_completed and "slot in use" as bool,
+# user_id as int32 category codes and the reminder id in an object array.
+# ReminderLog keeps the arrays in sync through the same add/discard hooks it
+# uses for DueIndex, so every write from csv_handler.py lands here
+# incrementally. Selecting the due reminders is one boolean mask plus an
+# argsort, and due_by_user() groups them with one more argsort.
+# Freed slots are reused, and the arrays double in size when they are full.
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+REMINDER_DUE_INDEX = os.environ.get('REMINDER_DUE_INDEX', 'heap').lower()
+
+NO_TIME = -(2 ** 63)  # reminder_time is missing or unparseable
+
+log = get_logger('columnar_index')
+
+
+def columnar_index_enabled():
+    if REMINDER_DUE_INDEX != 'numpy':
+        return False
+    if np is None:
+        log.warning("⚠️ REMINDER_DUE_INDEX=numpy but numpy is not installed, using the heap due index")
+        return False
+    return True
+
+
+class ColumnarDueIndex:
+    def __init__(self, capacity=1024):
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.times = np.full(capacity, NO_TIME, dtype=np.int64)
+        self.completed = np.zeros(capacity, dtype=bool)
+        self.live = np.zeros(capacity, dtype=bool)
+        self.user_codes = np.zeros(capacity, dtype=np.int32)
+        self.ids = np.empty(capacity, dtype=object)
+        self._slots = {}       # reminder id -> slot
+        self._free = []
+        self._size = 0         # slots handed out so far
+        self._user_codes = {}  # user_id -> code
+        self._users = []       # code -> user_id
+
+    def __len__(self):
+        return int(np.count_nonzero(self._pending_mask()))
+
+    def clear(self):
+        self._allocate(len(self.times))
+
+    def _grow(self):
+        capacity = len(self.times) * 2
+        for name in ('times', 'completed', 'live', 'user_codes', 'ids'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self.times[self._size:] = NO_TIME
+        self.live[self._size:] = False
+
+    def _user_code(self, user_id):
+        code = self._user_codes.get(user_id)
+        if code is None:
+            code = self._user_codes[user_id] = len(self._users)
+            self._users.append(user_id)
+        return code
+
+    def add(self, reminder):
+        """Store or overwrite the row for a Reminder record"""
+        slot = self._slots.get(reminder.id)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                if self._size == len(self.times):
+                    self._grow()
+                slot = self._size
+                self._size += 1
+            self._slots[reminder.id] = slot
+        self.times[slot] = NO_TIME if reminder.reminder_time is None else reminder.reminder_time
+        self.completed[slot] = reminder.is_completed
+        self.user_codes[slot] = self._user_code(reminder.user_id)
+        self.ids[slot] = reminder.id
+        self.live[slot] = True
+
+    def discard(self, reminder_id):
+        slot = self._slots.pop(reminder_id, None)
+        if slot is not None:
+            self.live[slot] = False
+            self.ids[slot] = None
+            self._free.append(slot)
+
+    def _pending_mask(self):
+        n = self._size
+        return self.live[:n] & ~self.completed[:n] & (self.times[:n] != NO_TIME)
+
+    def _due_slots(self, now):
+        """Slots of pending reminders due at or before now (epoch seconds), earliest first"""
+        n = self._size
+        slots = np.flatnonzero(self._pending_mask() & (self.times[:n] <= now))
+        return slots[np.argsort(self.times[slots], kind='stable')]
+
+    def peek(self, skip=None):
+        """Return the earliest pending due time (epoch seconds), or None; skip as for DueIndex.peek"""
+        mask = self._pending_mask()
+        for reminder_id, due in (skip or {}).items():
+            slot = self._slots.get(reminder_id)
+            if slot is not None and self.times[slot] == due:
+                mask[slot] = False
+        times = self.times[:self._size][mask]
+        return int(times.min()) if len(times) else None
+
+    def due(self, now):
+        """Return the ids of pending reminders due at or before now (epoch seconds), earliest first"""
+        return self.ids[self._due_slots(now)].tolist()
+
+    def due_by_user(self, now):
+        """Return {user_id: [reminder ids, earliest first]} for the reminders due at or before now"""
+        slots = self._due_slots(now)
+        if not len(slots):
+            return {}
+        # Stable sort by user keeps each user's reminders in due-time order
+        slots = slots[np.argsort(self.user_codes[slots], kind='stable')]
+        codes = self.user_codes[slots]
+        bounds = np.flatnonzero(np.diff(codes)) + 1
+        return {self._users[group_codes[0]]: self.ids[group].tolist()
+                for group, group_codes in zip(np.split(slots, bounds), np.split(codes, bounds))}
@@ -1,33 +1,26 @@
 from werkzeug.security import generate_password_hash, check_password_hash
 import csv
-import os
 import uuid
 import datetime
 
-USERS_CSV = os.path.join(os.path.dirname(__file__), '..', 'data', 'users.csv')
+from api import metrics
+from api.log import get_logger
+from api.storage import get_storage, USERS_CSV, REMINDERS_CSV
+from api.records import to_epoch, from_epoch
+from api.reminder_query import encode_cursor, decode_cursor
+
+# All reads and writes go through the configured storage backend (see api/storage.py).
+# STORAGE_BACKEND=csv keeps the flat files in data/, STORAGE_BACKEND=sqlite uses the indexed database.
+# Reads return User/Reminder records (api/records.py).
+
+log = get_logger('csv_handler')
 
 def read_users():
-    users = []
-    if not os.path.exists(USERS_CSV):
-        return users
-    with open(USERS_CSV, mode='r', newline='', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            users.append(row)
-    return users
-
-def write_users(users):
-    os.makedirs(os.path.dirname(USERS_CSV), exist_ok=True)
-    with open(USERS_CSV, mode='w', newline='', encoding='utf-8') as file:
-        fieldnames = ['id', 'email', 'password_hash', 'is_email_confirmed', 'verification_token', 'reset_token', 'reset_token_expiry', 'profile_picture', 'bio', 'email_credentials', 'app_password']
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        for user in users:
-            writer.writerow(user)
+    return get_storage().get_all_users()
 
 def add_user(email, password):
-    users = read_users()
-    if any(user['email'] == email for user in users):
+    storage = get_storage()
+    if storage.get_user_by_email(email):
         return None
     user_id = str(uuid.uuid4())
     password_hash = generate_password_hash(password)
@@ -44,96 +37,36 @@ def add_user(email, password):
         'email_credentials': '',
         'app_password': ''
     }
-    users.append(new_user)
-    write_users(users)
+    storage.insert_user(new_user)
     return user_id
 
 def get_user_by_email(email):
-    users = read_users()
-    for user in users:
-        if user['email'] == email:
-            return user
-    return None
+    return get_storage().get_user_by_email(email)
 
 def get_user_by_id(user_id):
-    users = read_users()
-    for user in users:
-        if user['id'] == user_id:
-            return user
-    return None
+    return get_storage().get_user_by_id(user_id)
+
+def get_users_by_ids(user_ids):
+    """Resolve many users at once, returns {user_id: user}"""
+    return get_storage().get_users_by_ids(set(str(user_id) for user_id in user_ids))
 
 def update_user_password(user_id, new_password_hash):
-    users = read_users()
-    updated = False
-    for user in users:
-        if user['id'] == user_id:
-            user['password_hash'] = new_password_hash
-            updated = True
-            break
-    if updated:
-        write_users(users)
-    return updated
+    return get_storage().update_user(user_id, password_hash=new_password_hash)
 
 def update_user_profile_picture(user_id, filename):
-    users = read_users()
-    updated = False
-    for user in users:
-        if user['id'] == user_id:
-            user['profile_picture'] = filename
-            updated = True
-            break
-    if updated:
-        write_users(users)
-    return updated
+    return get_storage().update_user(user_id, profile_picture=filename)
 
 def update_user_bio(user_id, bio):
-    users = read_users()
-    updated = False
-    for user in users:
-        if user['id'] == user_id:
-            user['bio'] = bio
-            updated = True
-            break
-    if updated:
-        write_users(users)
-    return updated
+    return get_storage().update_user(user_id, bio=bio)
 
 def update_user_email_credentials(user_id, email, app_password):
-    users = read_users()
-    updated = False
-    for user in users:
-        if user['id'] == user_id:
-            user['email_credentials'] = email
-            user['app_password'] = app_password
-            updated = True
-            break
-    if updated:
-        write_users(users)
-    return updated
+    return get_storage().update_user(user_id, email_credentials=email, app_password=app_password)
 
 def update_user_reminder_email(user_id, email):
-    users = read_users()
-    updated = False
-    for user in users:
-        if user['id'] == user_id:
-            user['reminder_email'] = email
-            updated = True
-            break
-    if updated:
-        write_users(users)
-    return updated
+    return get_storage().update_user(user_id, reminder_email=email)
 
 def update_user_reminder_app_password(user_id, app_password):
-    users = read_users()
-    updated = False
-    for user in users:
-        if user['id'] == user_id:
-            user['reminder_app_password'] = app_password
-            updated = True
-            break
-    if updated:
-        write_users(users)
-    return updated
+    return get_storage().update_user(user_id, reminder_app_password=app_password)
 
 def verify_password(password, password_hash):
     return check_password_hash(password_hash, password)
@@ -152,68 +85,54 @@ def generate_reset_token(email):
     return str(uuid.uuid4())
 
 def set_reset_token(user_id, token, expiry):
-    users = read_users()
-    updated = False
-    for user in users:
-        if user['id'] == user_id:
-            user['reset_token'] = token
-            user['reset_token_expiry'] = str(expiry)
-            updated = True
-            break
-    if updated:
-        write_users(users)
-    return updated
+    return get_storage().update_user(user_id, reset_token=token, reset_token_expiry=str(expiry))
 
 def reset_password(token, new_password):
-    users = read_users()
-    updated = False
-    for user in users:
-        if user['reset_token'] == token:
-            user['password_hash'] = generate_password_hash(new_password)
-            user['reset_token'] = ''
-            user['reset_token_expiry'] = ''
-            updated = True
-            break
-    if updated:
-        write_users(users)
-    return updated
+    storage = get_storage()
+    user = storage.get_user_by_reset_token(token)
+    if not user:
+        return False
+    return storage.update_user(
+        user.id,
+        password_hash=generate_password_hash(new_password),
+        reset_token='',
+        reset_token_expiry=''
+    )
 
 # Reminder functions
 def get_all_reminders():
-    REMINDERS_CSV = os.path.join(os.path.dirname(__file__), '..', 'data', 'reminders.csv')
-    if not os.path.exists(REMINDERS_CSV):
-        return []
-    with open(REMINDERS_CSV, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        return list(reader)
+    return get_storage().get_all_reminders()
+
+def get_due_reminders(now):
+    return get_storage().get_due_reminders(now)
+
+def get_due_reminders_by_user(now):
+    return get_storage().get_due_reminders_by_user(now)
+
+def get_next_due_time(skip=None):
+    return get_storage().get_next_due_time(skip)
+
+# Callbacks told about new or rescheduled reminder times (used by the reminder timer)
+_reminder_listeners = []
+
+def add_reminder_listener(listener):
+    _reminder_listeners.append(listener)
+
+def _notify_reminder_time(reminder_time):
+    for listener in _reminder_listeners:
+        try:
+            listener(reminder_time)
+        except Exception as e:
+            log.error("❌ Reminder listener failed: %s", e, exc_info=True)
 
 def mark_reminder_completed(reminder_id):
-    REMINDERS_CSV = os.path.join(os.path.dirname(__file__), '..', 'data', 'reminders.csv')
-    if not os.path.exists(REMINDERS_CSV):
-        return False
-    reminders = []
-    with open(REMINDERS_CSV, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        reminders = list(reader)
-
-    updated = False
-    for reminder in reminders:
-        if reminder['id'] == str(reminder_id):
-            reminder['is_completed'] = 'True'
-            updated = True
-            break
-
-    if updated:
-        os.makedirs(os.path.dirname(REMINDERS_CSV), exist_ok=True)
-        with open(REMINDERS_CSV, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=['id', 'user_id', 'title', 'description', 'reminder_time', 'recipient_email', 'is_completed'])
-            writer.writeheader()
-            writer.writerows(reminders)
-        return True
-    return False
+    return get_storage().update_reminder(str(reminder_id), is_completed='True')
+
+def mark_reminders_completed(reminder_ids):
+    """Mark many reminders completed in a single write, return how many were updated"""
+    return get_storage().update_reminders([(str(reminder_id), {'is_completed': 'True'}) for reminder_id in reminder_ids])
 
 def add_reminder(user_id, title, description, reminder_time, recipient_email):
-    REMINDERS_CSV = os.path.join(os.path.dirname(__file__), '..', 'data', 'reminders.csv')
     reminder_id = str(uuid.uuid4())
     new_reminder = {
         'id': reminder_id,
@@ -224,92 +143,102 @@ def add_reminder(user_id, title, description, reminder_time, recipient_email):
         'recipient_email': recipient_email,
         'is_completed': 'False'
     }
-    reminders = []
-    if os.path.exists(REMINDERS_CSV):
-        with open(REMINDERS_CSV, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            reminders = list(reader)
-    reminders.append(new_reminder)
-    os.makedirs(os.path.dirname(REMINDERS_CSV), exist_ok=True)
-    with open(REMINDERS_CSV, 'w', newline='', encoding='utf-8') as f:
-        fieldnames = ['id', 'user_id', 'title', 'description', 'reminder_time', 'recipient_email', 'is_completed']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(reminders)
+    get_storage().insert_reminder(new_reminder)
+    if isinstance(reminder_time, datetime.datetime):
+        _notify_reminder_time(reminder_time)
     return reminder_id
 
 def get_reminders_by_user_id(user_id):
-    REMINDERS_CSV = os.path.join(os.path.dirname(__file__), '..', 'data', 'reminders.csv')
-    if not os.path.exists(REMINDERS_CSV):
-        return []
-    with open(REMINDERS_CSV, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        return [reminder for reminder in reader if reminder['user_id'] == user_id]
+    return get_storage().get_reminders_by_user_id(user_id)
+
+def iter_reminders_by_user_id(user_id):
+    return get_storage().iter_reminders_by_user_id(user_id)
+
+def query_reminders(user_id, status=None, start=None, end=None, cursor=None, limit=25):
+    """Return (reminders, next_cursor) for one page of a user's reminders ordered by reminder_time.
+
+    start/end are inclusive bounds in epoch seconds, next_cursor is None on the last page.
+    """
+    reminders = get_storage().query_reminders(user_id, status, start, end, decode_cursor(cursor), limit + 1)
+    if len(reminders) > limit:
+        reminders = reminders[:limit]
+        return reminders, encode_cursor(reminders[-1])
+    return reminders, None
+
+def count_reminders(user_id):
+    return get_storage().count_reminders(user_id)
 
 def get_reminder_by_id(reminder_id):
-    REMINDERS_CSV = os.path.join(os.path.dirname(__file__), '..', 'data', 'reminders.csv')
-    if not os.path.exists(REMINDERS_CSV):
-        return None
-    with open(REMINDERS_CSV, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for reminder in reader:
-            if reminder['id'] == reminder_id:
-                return reminder
-    return None
+    return get_storage().get_reminder_by_id(reminder_id)
 
 def update_reminder(reminder_id, title=None, description=None, reminder_time=None, recipient_email=None, is_completed=None):
-    REMINDERS_CSV = os.path.join(os.path.dirname(__file__), '..', 'data', 'reminders.csv')
-    if not os.path.exists(REMINDERS_CSV):
-        return False
-    reminders = []
-    with open(REMINDERS_CSV, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        reminders = list(reader)
-
-    updated = False
-    for reminder in reminders:
-        if reminder['id'] == reminder_id:
-            if title is not None:
-                reminder['title'] = title
-            if description is not None:
-                reminder['description'] = description
-            if reminder_time is not None:
-                reminder['reminder_time'] = reminder_time
-            if recipient_email is not None:
-                reminder['recipient_email'] = recipient_email
-            if is_completed is not None:
-                reminder['is_completed'] = is_completed
-            updated = True
-            break
-
-    if updated:
-        os.makedirs(os.path.dirname(REMINDERS_CSV), exist_ok=True)
-        with open(REMINDERS_CSV, 'w', newline='', encoding='utf-8') as f:
-            fieldnames = ['id', 'user_id', 'title', 'description', 'reminder_time', 'recipient_email', 'is_completed']
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(reminders)
-        return True
-    return False
+    fields = {}
+    if title is not None:
+        fields['title'] = title
+    if description is not None:
+        fields['description'] = description
+    if reminder_time is not None:
+        fields['reminder_time'] = reminder_time
+    if recipient_email is not None:
+        fields['recipient_email'] = recipient_email
+    if is_completed is not None:
+        fields['is_completed'] = is_completed
+    updated = get_storage().update_reminder(reminder_id, **fields)
+    if updated and isinstance(reminder_time, datetime.datetime):
+        _notify_reminder_time(reminder_time)
+    return updated
 
 def delete_reminder(reminder_id):
-    REMINDERS_CSV = os.path.join(os.path.dirname(__file__), '..', 'data', 'reminders.csv')
-    if not os.path.exists(REMINDERS_CSV):
-        return False
-    reminders = []
-    with open(REMINDERS_CSV, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        reminders = list(reader)
-
-    original_length = len(reminders)
-    reminders = [reminder for reminder in reminders if reminder['id'] != reminder_id]
-
-    if len(reminders) < original_length:
-        os.makedirs(os.path.dirname(REMINDERS_CSV), exist_ok=True)
-        with open(REMINDERS_CSV, 'w', newline='', encoding='utf-8') as f:
-            fieldnames = ['id', 'user_id', 'title', 'description', 'reminder_time', 'recipient_email', 'is_completed']
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(reminders)
-        return True
-    return False
+    return get_storage().delete_reminder(reminder_id)
+
+def import_reminders_csv(user_id, text_stream):
+    """Import reminders for a user from a CSV text stream in one bulk write.
+
+    Rows are read one at a time; a row matching an existing reminder by
+    (title, reminder_time) updates it, any other valid row is inserted.
+    Returns (imported_count, updated_count, errors) where errors is a list of
+    (line_number, message) for the rows that were skipped.
+    """
+    storage = get_storage()
+    existing = {}
+    for reminder in storage.get_reminders_by_user_id(user_id):
+        existing.setdefault((reminder.title, reminder.reminder_time), reminder.id)
+
+    inserts = {}
+    updates = {}
+    errors = []
+    earliest = None
+    reader = csv.DictReader(text_stream)
+    for row in reader:
+        line_number = reader.line_num
+        title = row.get('title')
+        if not title or not row.get('reminder_time'):
+            errors.append((line_number, 'missing title or reminder_time'))
+            continue
+        try:
+            reminder_time = datetime.datetime.strptime(row['reminder_time'], '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            errors.append((line_number, f"invalid reminder_time '{row['reminder_time']}'"))
+            continue
+
+        key = (title, to_epoch(reminder_time))
+        earliest = key[1] if earliest is None else min(earliest, key[1])
+        fields = {'title': title, 'description': row.get('description') or '', 'reminder_time': str(reminder_time)}
+        if row.get('recipient_email'):
+            fields['recipient_email'] = row['recipient_email']
+
+        if key in inserts:
+            # Duplicate within the upload, last row wins
+            inserts[key].update(fields)
+        elif key in existing:
+            updates.setdefault(existing[key], {}).update(fields)
+        else:
+            inserts[key] = dict({'id': str(uuid.uuid4()), 'user_id': user_id, 'recipient_email': '', 'is_completed': 'False'}, **fields)
+
+    imported_count, updated_count = storage.apply_reminder_changes(list(inserts.values()), list(updates.items()))
+    if earliest is not None:
+        _notify_reminder_time(from_epoch(earliest))
+    return imported_count, updated_count, errors
+
+# Time every public operation above (leaves them untouched unless METRICS_ENABLED)
+metrics.instrument(globals(), 'storage_operation_seconds', 'operation', exclude=('add_reminder_listener',))
@@ -0,0 +1,76 @@
+import heapq
+
+# Min-heap of pending reminders keyed by reminder_time (epoch seconds).
+#
+# Only reminders that are not completed and have a reminder_time are indexed. Removals are lazy: the heap may hold stale entries, which are dropped
+# when they reach the top. Collecting the k due reminders costs O(k log n).
+
+class DueIndex:
+    def __init__(self):
+        self._heap = []
+        self._pending = {}  # reminder id -> due time of its live heap entry
+
+    def __len__(self):
+        return len(self._pending)
+
+    def clear(self):
+        self._heap = []
+        self._pending = {}
+
+    def add(self, reminder):
+        """Index a Reminder if it is pending, otherwise make sure it is not indexed"""
+        due = None if reminder.is_completed else reminder.reminder_time
+        if due is None:
+            self._pending.pop(reminder.id, None)
+            return
+        if self._pending.get(reminder.id) == due:
+            return
+        self._pending[reminder.id] = due
+        heapq.heappush(self._heap, (due, reminder.id))
+        if len(self._heap) > 2 * len(self._pending) + 64:
+            # Too many stale entries, rebuild from the live ones
+            self._heap = [(due, reminder_id) for reminder_id, due in self._pending.items()]
+            heapq.heapify(self._heap)
+
+    def discard(self, reminder_id):
+        self._pending.pop(reminder_id, None)
+
+    def _is_live(self, entry):
+        return self._pending.get(entry[1]) == entry[0]
+
+    def peek(self, skip=None):
+        """Return the earliest pending due time (epoch seconds), or None.
+
+        skip ({reminder id: due time}) leaves out reminders handled elsewhere for as long as their due time is unchanged.
+        """
+        while self._heap and not self._is_live(self._heap[0]):
+            heapq.heappop(self._heap)
+        if not skip:
+            return self._heap[0][0] if self._heap else None
+        popped = []
+        found = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if not self._is_live(entry):
+                continue
+            popped.append(entry)
+            if skip.get(entry[1]) != entry[0]:
+                found = entry[0]
+                break
+        for entry in popped:
+            heapq.heappush(self._heap, entry)
+        return found
+
+    def due(self, now):
+        """Return the ids of pending reminders due at or before now (epoch seconds), earliest first"""
+        due = []
+        seen = set()
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if self._is_live(entry) and entry not in seen:
+                seen.add(entry)
+                due.append(entry)
+        # Due reminders stay pending until they are marked completed
+        for entry in due:
+            heapq.heappush(self._heap, entry)
+        return [reminder_id for _, reminder_id in due]
@@ -1,15 +1,25 @@
-import smtplib
 import os
 import sys
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import time
 from datetime import datetime
 import concurrent.futures
+import logging
 
 # Add project directory to path for imports when running as script
 sys.path.insert(0, 'py-project')
 
-from api.csv_handler import get_all_reminders, mark_reminder_completed, get_user_by_id
+from api.csv_handler import get_due_reminders_by_user, mark_reminders_completed, get_users_by_ids, get_reminder_by_id
+from api import metrics, outbox, profiler
+from api.records import to_epoch
+from api.email_templates import render, render_message
+from api.smtp_pool import smtp_pool, open_smtp
+from api.async_delivery import async_delivery_enabled, deliver_reminders_async
+from api.rate_limit import acquire_or_wait_seconds
+from api.leader import acquire_lease, release_lease, claim_reminder, release_claims
+from api.log import get_logger, SAMPLED
+
+# Per-reminder lines are sampled DEBUG; a tick logs one summary at INFO (see api/log.py)
+log = get_logger('email_service')
 
 # Email configuration (should be moved to environment variables in production)
 # No default credentials, user must set their own
@@ -19,274 +29,293 @@ DEFAULT_APP_PASSWORD = None
 # System email credentials for auth notifications (password reset, confirmations)
 # Load from environment variables inside functions for dynamic updates
 
-def send_reminder_email(receiver_email, reminder_title, reminder_description, reminder_time, user_id=None):
-    """Send a reminder email to the specified recipient"""
-    try:
-        # Get user-specific credentials, no defaults
-        if user_id:
-            user = get_user_by_id(user_id)
-            sender_email = user.get('email_credentials') if user else None
-            app_password = user.get('app_password') if user else None
-        else:
-            sender_email = None
-            app_password = None
-
-        # Check if credentials are set
-        if not sender_email or not app_password:
-            print(f"❌ Email credentials not set for user {user_id}. Please set email credentials in settings.")
-            print(f"   sender_email: {'set' if sender_email else 'not set'}")
-            print(f"   app_password: {'set' if app_password else 'not set'}")
-            return False
-
-        # Create email
-        msg = MIMEMultipart()
-        msg["From"] = sender_email
-        msg["To"] = receiver_email
-        msg["Subject"] = f"Reminder: {reminder_title}"
-
-        body = f"""
-        Hello!
-
-        This is a reminder for: {reminder_title}
-
-        Description: {reminder_description or 'No description provided'}
-
-        Scheduled Time: {reminder_time.strftime('%Y-%m-%d %H:%M')}
-
-        ---
-        This is an automated reminder from the Reminder App.
-        """
-
-        msg.attach(MIMEText(body, "plain"))
-
-        # Connect to Gmail SMTP server
-        server = smtplib.SMTP_SSL("smtp.gmail.com", 465)
-        server.login(sender_email, app_password)
-
-        # Send email
-        server.sendmail(sender_email, receiver_email, msg.as_string())
-        server.quit()
-
-        print(f"✅ Email sent successfully to {receiver_email}")
-        return True
+def build_reminder_message(sender_email, receiver_email, reminder_title, reminder_description, reminder_time):
+    """Render a reminder email as bytes ready to send"""
+    return render_message('reminder', sender_email, receiver_email, title=reminder_title,
+                          description=reminder_description or 'No description provided',
+                          reminder_time=reminder_time)
 
-    except Exception as e:
-        print(f"❌ Error sending email to {receiver_email}: {e}")
-        return False
-
-def send_test_email(sender_email, app_password, test_recipient_email):
+def send_test_email(sender_email, app_password, test_recipient_email, template='test_email'):
     """Send a test email to verify credentials"""
     try:
-        # Create test email
-        msg = MIMEMultipart()
-        msg["From"] = sender_email
-        msg["To"] = test_recipient_email
-        msg["Subject"] = "Test Email from Reminder App"
-
-        body = """
-        Hello!
+        msg = render_message(template, sender_email, test_recipient_email)
 
-        This is a test email from the Reminder App to verify your email credentials are working correctly.
-
-        If you received this email, your settings are configured properly.
-
-        ---
-        This is an automated test email from the Reminder App.
-        """
-
-        msg.attach(MIMEText(body, "plain"))
+        wait = acquire_or_wait_seconds(sender_email)
+        if wait:
+            log.info("⏭️ Test email to %s deferred %.0fs - %s is over its sending budget", test_recipient_email,
+                     wait, sender_email)
+            return False
 
-        # Connect to Gmail SMTP server
-        server = smtplib.SMTP_SSL("smtp.gmail.com", 465)
-        server.login(sender_email, app_password)
+        # Connect to the configured SMTP server (Gmail by default)
+        server = open_smtp(sender_email, app_password)
 
         # Send email
-        server.sendmail(sender_email, test_recipient_email, msg.as_string())
+        server.sendmail(sender_email, test_recipient_email, msg)
         server.quit()
 
-        print(f"✅ Test email sent successfully to {test_recipient_email}")
+        log.info("✅ Test email sent successfully to %s", test_recipient_email)
         return True
 
     except Exception as e:
-        print(f"❌ Error sending test email to {test_recipient_email}: {e}")
+        log.warning("❌ Error sending test email to %s: %s", test_recipient_email, e)
         return False
 
+DISPATCH_LEASE = 'reminder-dispatcher'
+
+@profiler.profiled('tick', follow=('reminder-send',))
 def check_and_send_reminders(app):
-    """Check for reminders that are due and send emails"""
+    """Check for reminders that are due and send emails, return False if another dispatcher holds the lease"""
     with app.app_context():
         current_time = datetime.now()
-        print(f"🔄 Checking reminders at {current_time}")
-
-        # Get all reminders
-        all_reminders = get_all_reminders()
-        print(f"📋 Found {len(all_reminders)} total reminders")
-
-        # Collect reminders to send
-        reminders_to_send = []
-        for reminder in all_reminders:
-            print(f"🔍 Checking reminder '{reminder['title']}' - Completed: {reminder['is_completed']}")
-
-            # Skip completed reminders
-            if reminder['is_completed'] == 'True':
-                continue
-
-            # Parse reminder time
-            try:
-                reminder_time = datetime.strptime(reminder['reminder_time'], '%Y-%m-%d %H:%M:%S')
-                print(f"   Reminder time: {reminder_time}, Current time: {current_time}")
-            except ValueError:
-                print(f"   ❌ Invalid reminder time format: {reminder['reminder_time']}")
-                continue
-
-            # Check if reminder is due
-            if reminder_time <= current_time:
-                print(f"   ✅ Reminder is due")
-                user = get_user_by_id(str(reminder['user_id']))
-                if user:
-                    # Check if user has set email credentials
-                    if not user.get('email_credentials') or not user.get('app_password'):
-                        print(f"⚠️  Skipping reminder '{reminder['title']}' - user {reminder['user_id']} has not set email credentials")
-                        continue
-
-                    # Use custom recipient email if provided, otherwise use user's email
-                    recipient_email = reminder.get('recipient_email', '') or user['email']
-                    print(f"   📧 Will send to {recipient_email}")
-
-                    reminders_to_send.append((reminder, recipient_email, reminder_time, user))
-                else:
-                    print(f"   ❌ User {reminder['user_id']} not found")
-                    # Add error handling to avoid crash
-                    continue
-            else:
-                print(f"   ⏰ Reminder not yet due")
-
-        # Send emails in parallel
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            futures = [
-                executor.submit(send_reminder_and_mark, reminder, recipient_email, reminder_time, user)
-                for reminder, recipient_email, reminder_time, user in reminders_to_send
-            ]
+
+        # Only one scheduler/cron invocation across all processes dispatches at a time
+        lease = acquire_lease(DISPATCH_LEASE)
+        if not lease:
+            log.info("⏭️ Skipping reminder check at %s - another dispatcher holds the lease", current_time)
+            return False
+        claims = []
+        try:
+            with metrics.timer('dispatcher_tick_seconds'):
+                dispatch_due_reminders(current_time, claims)
+        finally:
+            if claims:
+                release_claims(claims)
+            release_lease(DISPATCH_LEASE, lease)
+        return True
+
+OUTBOX_WORKERS = int(os.environ.get('OUTBOX_WORKERS', 10))
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 500))
+
+def dispatch_due_reminders(current_time, claims):
+    """Queue due reminders in the outbox and drain it; claim tokens taken are appended to claims for the caller to release"""
+    started = time.perf_counter()
+    log.debug("🔄 Checking reminders at %s", current_time)
+
+    # Only pending reminders that are already due, served by the storage due-time index
+    due_by_user = get_due_reminders_by_user(current_time)
+    due_reminders = [reminder for reminders in due_by_user.values() for reminder in reminders]
+    written = outbox.enqueue(due_reminders) if due_reminders else []
+    if written:
+        # Sent but never marked completed (crash in between): finish that instead of leaving it due forever
+        already_sent = outbox.ids_with_status(written, outbox.SENT)
+        if already_sent:
+            mark_reminders_completed(already_sent)
+    if metrics.METRICS_ENABLED:
+        # Only what this tick can act on: dead letters and entries backing off would count again every tick
+        metrics.inc('reminders_due_total', len(written))
+        oldest = outbox.oldest_ready_reminder_time()
+        metrics.set_gauge('scheduler_lag_seconds', 0 if oldest is None else max(to_epoch(current_time) - oldest, 0))
+
+    # Entries backing off after a failure are not ready and cost nothing here
+    totals = {'ready': 0, 'sent': 0, 'failed': 0, 'deferred': 0}
+    while True:
+        entries = outbox.ready(limit=OUTBOX_BATCH_SIZE)
+        if not entries:
+            break
+        totals['ready'] += len(entries)
+        if not drain_outbox(entries, claims, totals) or len(entries) < OUTBOX_BATCH_SIZE:
+            break
+
+    # One summary line per tick; INFO only when something was attempted
+    level = logging.INFO if totals['ready'] else logging.DEBUG
+    log.log(level, "📋 Tick at %s: %d due for %d users, %d ready, %d sent, %d failed, %d deferred in %.2fs",
+            current_time, len(due_reminders), len(due_by_user), totals['ready'], totals['sent'],
+            totals['failed'], totals['deferred'], time.perf_counter() - started,
+            extra=dict(totals, due=len(due_reminders), users=len(due_by_user)))
+
+    outbox.purge_sent()
+    smtp_pool.close_idle()
+
+def drain_outbox(entries, claims, totals=None):
+    """Send one batch of ready outbox entries, return how many were attempted.
+
+    totals, if given, accumulates the sent/failed/deferred counts for the tick summary.
+    """
+    reminders_to_send = []
+    failures = {}
+    permanent = {}  # failures no retry can fix, dead-lettered at once
+    not_ready = {}  # reminder_id -> seconds until it is looked at again, without using up an attempt
+    gone = []
+    due = []
+    for entry in entries:
+        reminder = get_reminder_by_id(entry['reminder_id'])
+        if not reminder or reminder.is_completed:
+            # Deleted or completed since it was queued
+            gone.append(entry['reminder_id'])
+            continue
+        log.debug("🔍 Reminder '%s' is due at %s (attempt %d)", reminder.title, reminder.reminder_time_text,
+                  entry['attempts'] + 1, extra=SAMPLED)
+
+        if reminder.reminder_time is None:
+            log.warning("❌ Reminder '%s' has no valid reminder time", reminder.title, extra={'reminder_id': reminder.id})
+            gone.append(entry['reminder_id'])
+            continue
+        due.append((reminder, reminder.due_at))
+
+    # One id -> credentials map for the whole batch instead of a lookup per reminder
+    users = get_users_by_ids(reminder.user_id for reminder, _ in due)
+
+    for reminder, reminder_time in due:
+        user = users.get(str(reminder.user_id))
+        if not user:
+            log.warning("❌ User %s not found for reminder %s", reminder.user_id, reminder.id)
+            permanent[reminder.id] = 'user not found'
+            continue
+
+        # Check if user has set email credentials
+        if not user.email_credentials or not user.app_password:
+            log.warning("⚠️ Skipping reminder '%s' - user %s has not set email credentials", reminder.title,
+                        reminder.user_id, extra={'reminder_id': reminder.id})
+            # Sent once the user adds them, so retry without using up an attempt
+            not_ready[reminder.id] = outbox.OUTBOX_BACKOFF_BASE
+            continue
+
+        # Claim the reminder before it is handed to a sender
+        token = claim_reminder(reminder.id)
+        if not token:
+            # Look again once the other dispatcher is likely done, instead of on every tick
+            log.debug("⏭️ Reminder '%s' is claimed by another dispatcher", reminder.title, extra=SAMPLED)
+            not_ready[reminder.id] = outbox.OUTBOX_BACKOFF_BASE
+            continue
+        claims.append((reminder.id, token))
+
+        # Use custom recipient email if provided, otherwise use user's email
+        recipient_email = reminder.recipient_email or user.email
+        log.debug("📧 Will send '%s' to %s", reminder.title, recipient_email, extra=SAMPLED)
+
+        reminders_to_send.append((reminder, recipient_email, reminder_time, user))
+
+    # Another dispatcher may have sent a reminder between the read above and our claim,
+    # so only send what is still queued in the outbox and still pending in storage
+    still_queued = outbox.ids_with_status([item[0].id for item in reminders_to_send])
+    confirmed = []
+    for item in reminders_to_send:
+        reminder = item[0]
+        if reminder.id not in still_queued:
+            log.debug("⏭️ Reminder '%s' was already handled by another dispatcher", reminder.title, extra=SAMPLED)
+            continue
+        current = get_reminder_by_id(reminder.id)
+        if not current or current.is_completed:
+            gone.append(reminder.id)
+            continue
+        confirmed.append(item)
+    reminders_to_send = confirmed
+
+    if gone:
+        outbox.discard(gone)
+
+    # Group by sender account so each batch reuses one pooled SMTP connection
+    batches = {}
+    for item in reminders_to_send:
+        user = item[3]
+        batches.setdefault(user.email_credentials, []).append(item)
+
+    sent_ids = []
+    deferred = dict(not_ready)
+    if async_delivery_enabled():
+        batch_sent, batch_failures, batch_deferred = deliver_reminders_async(list(batches.values()))
+        sent_ids.extend(batch_sent)
+        failures.update(batch_failures)
+        deferred.update(batch_deferred)
+    else:
+        # Send batches for different senders on the worker pool
+        with concurrent.futures.ThreadPoolExecutor(max_workers=OUTBOX_WORKERS, thread_name_prefix='reminder-send') as executor:
+            futures = {executor.submit(send_reminder_batch, batch): batch for batch in batches.values()}
             for future in concurrent.futures.as_completed(futures):
                 try:
-                    future.result()
+                    batch_sent, batch_failures, batch_deferred = future.result()
                 except Exception as e:
-                    print(f"❌ Error in sending reminder: {e}")
-
-def send_reminder_and_mark(reminder, recipient_email, reminder_time, user):
-    """Send reminder email and mark as completed"""
-    success = send_reminder_email(
-        recipient_email,
-        reminder['title'],
-        reminder['description'],
-        reminder_time,
-        reminder['user_id']
-    )
-
-    if success:
-        # Mark reminder as completed
-        mark_reminder_completed(reminder['id'])
-        print(f"✅ Reminder '{reminder['title']}' sent to {recipient_email} and marked as completed")
-    else:
-        print(f"❌ Failed to send reminder '{reminder['title']}' to {recipient_email}")
-
-def send_password_reset_email(user_email, reset_token, user_name):
-    """Send password reset email with link"""
+                    log.error("❌ Error in sending reminder batch: %s", e, exc_info=True)
+                    batch_sent, batch_failures, batch_deferred = [], {item[0].id: e for item in futures[future]}, {}
+                sent_ids.extend(batch_sent)
+                failures.update(batch_failures)
+                deferred.update(batch_deferred)
+
+    # Record the outcome in the outbox first, so a sent reminder is never sent again
+    retrying, dead = outbox.record_results(entries, sent_ids, failures, deferred, permanent)
+    failures.update(permanent)
+    metrics.inc('reminders_sent_total', len(sent_ids))
+    metrics.inc('reminders_failed_total', len(failures))
+    metrics.inc('reminders_deferred_total', len(deferred))
+    if sent_ids:
+        mark_reminders_completed(sent_ids)
+    if failures:
+        log.warning("⚠️ %d reminders failed: %d will be retried, %d dead-lettered", len(failures), retrying, dead)
+    if totals is not None:
+        totals['sent'] += len(sent_ids)
+        totals['failed'] += len(failures)
+        totals['deferred'] += len(deferred)
+    return len(sent_ids) + len(failures)
+
+def send_reminder_batch(batch):
+    """Send a batch of reminders that share one sender account.
+
+    Returns (sent_ids, {reminder_id: error}, {reminder_id: defer_seconds}); once
+    the sender is over its rate limit the rest of the batch is deferred unsent.
+    """
+    sent_ids = []
+    failures = {}
+    deferred = {}
+    for reminder, recipient_email, reminder_time, user in batch:
+        # Once the sender is over budget the rest of its batch waits as well
+        wait = next(iter(deferred.values())) if deferred else acquire_or_wait_seconds(user.email_credentials)
+        if wait:
+            deferred[reminder.id] = wait
+            continue
+        try:
+            send_reminder_message(reminder, recipient_email, reminder_time, user)
+            sent_ids.append(reminder.id)
+            log.debug("✅ Reminder '%s' sent to %s", reminder.title, recipient_email, extra=SAMPLED)
+        except Exception as e:
+            log.warning("❌ Failed to send reminder '%s' to %s: %s", reminder.title, recipient_email, e,
+                        extra={'reminder_id': reminder.id, 'sender': user.email_credentials})
+            failures[reminder.id] = e
+    return sent_ids, failures, deferred
+
+def send_reminder_message(reminder, recipient_email, reminder_time, user):
+    """Send one reminder over the sender's pooled connection, raising on failure"""
+    msg = build_reminder_message(user.email_credentials, recipient_email, reminder.title,
+                                 reminder.description, reminder_time)
+    smtp_pool.sendmail(user.email_credentials, user.app_password, recipient_email, msg)
+
+def send_system_email(template, user_email, label, **context):
+    """Send one of the account emails (password reset, OTP) from the system sender account"""
     try:
         SYSTEM_SENDER_EMAIL = os.environ.get('SYSTEM_SENDER_EMAIL')
         SYSTEM_APP_PASSWORD = os.environ.get('SYSTEM_APP_PASSWORD')
 
-        msg = MIMEMultipart()
-        msg["From"] = SYSTEM_SENDER_EMAIL or "noreply@reminderapp.local"
-        msg["To"] = user_email
-        msg["Subject"] = "Password Reset for Reminder App"
-
-        base_url = os.environ.get('BASE_URL', 'http://localhost:5000')
-        reset_link = f"{base_url.rstrip('/')}/reset-password?token={reset_token}"
-        body = f"""
-        Hello {user_name},
-
-        You requested a password reset for your Reminder App account.
-
-        Click the link below to reset your password:
-        {reset_link}
-
-        This link will expire in 1 hour.
-
-        If you didn't request this, please ignore this email.
-
-        ---
-        This is an automated email from the Reminder App.
-        """
-
-        msg.attach(MIMEText(body, "plain"))
-
         if SYSTEM_SENDER_EMAIL and SYSTEM_APP_PASSWORD:
-            # Use Gmail SMTP
-            server = smtplib.SMTP_SSL("smtp.gmail.com", 465)
-            server.login(SYSTEM_SENDER_EMAIL, SYSTEM_APP_PASSWORD)
-            server.sendmail(SYSTEM_SENDER_EMAIL, user_email, msg.as_string())
+            wait = acquire_or_wait_seconds(SYSTEM_SENDER_EMAIL)
+            if wait:
+                log.info("⏭️ %s to %s deferred %.0fs - system sender is over its sending budget", label, user_email, wait)
+                return False
+            msg = render_message(template, SYSTEM_SENDER_EMAIL, user_email, **context)
+
+            server = open_smtp(SYSTEM_SENDER_EMAIL, SYSTEM_APP_PASSWORD)
+            server.sendmail(SYSTEM_SENDER_EMAIL, user_email, msg)
             server.quit()
-            print(f"✅ Password reset email sent to {user_email}")
+            log.info("✅ %s sent to %s", label, user_email)
         else:
             # Fallback for development: log email content to console
-            print("⚠️ System email credentials not set, logging email content for development")
-            print(f"   SYSTEM_SENDER_EMAIL: {'set' if SYSTEM_SENDER_EMAIL else 'not set'}")
-            print(f"   SYSTEM_APP_PASSWORD: {'set' if SYSTEM_APP_PASSWORD else 'not set'}")
-            print(f"📧 Password reset email for {user_email}:")
-            print(f"Subject: {msg['Subject']}")
-            print(f"Body:\n{body}")
-            print(f"Reset Link: {reset_link}")
-            print("✅ Password reset email logged (copy the link above to reset password)")
+            subject, body = render(template, **context)
+            log.warning("⚠️ System email credentials not set (SYSTEM_SENDER_EMAIL: %s, SYSTEM_APP_PASSWORD: %s), "
+                        "logging email content for development",
+                        'set' if SYSTEM_SENDER_EMAIL else 'not set', 'set' if SYSTEM_APP_PASSWORD else 'not set')
+            log.info("📧 %s for %s:\nSubject: %s\nBody:\n%s", label, user_email, subject, body)
 
         return True
 
     except Exception as e:
-        print(f"❌ Error sending password reset email to {user_email}: {e}")
+        log.warning("❌ Error sending %s to %s: %s", label.lower(), user_email, e)
         return False
 
+def send_password_reset_email(user_email, reset_token, user_name):
+    """Send password reset email with link"""
+    base_url = os.environ.get('BASE_URL', 'http://localhost:5000')
+    reset_link = f"{base_url.rstrip('/')}/reset-password?token={reset_token}"
+    return send_system_email('password_reset', user_email, 'Password reset email',
+                             user_name=user_name, reset_link=reset_link)
+
 def send_email_confirmation_otp(user_email, otp, user_name):
     """Send email confirmation OTP"""
-    try:
-        SYSTEM_SENDER_EMAIL = os.environ.get('SYSTEM_SENDER_EMAIL')
-        SYSTEM_APP_PASSWORD = os.environ.get('SYSTEM_APP_PASSWORD')
-
-        msg = MIMEMultipart()
-        msg["From"] = SYSTEM_SENDER_EMAIL or "noreply@reminderapp.local"
-        msg["To"] = user_email
-        msg["Subject"] = "Email Confirmation Code for Reminder App"
-
-        body = f"""
-        Hello {user_name},
-
-        Your OTP for email confirmation is: {otp}
-
-        This code expires in 5 minutes.
-
-        ---
-        This is an automated email from the Reminder App.
-        """
-
-        msg.attach(MIMEText(body, "plain"))
-
-        if SYSTEM_SENDER_EMAIL and SYSTEM_APP_PASSWORD:
-            # Use Gmail SMTP
-            server = smtplib.SMTP_SSL("smtp.gmail.com", 465)
-            server.login(SYSTEM_SENDER_EMAIL, SYSTEM_APP_PASSWORD)
-            server.sendmail(SYSTEM_SENDER_EMAIL, user_email, msg.as_string())
-            server.quit()
-            print(f"✅ OTP email sent to {user_email}")
-        else:
-            # Fallback for development: log email content to console
-            print("⚠️ System email credentials not set, logging email content for development")
-            print(f"   SYSTEM_SENDER_EMAIL: {'set' if SYSTEM_SENDER_EMAIL else 'not set'}")
-            print(f"   SYSTEM_APP_PASSWORD: {'set' if SYSTEM_APP_PASSWORD else 'not set'}")
-            print(f"📧 OTP email for {user_email}:")
-            print(f"Subject: {msg['Subject']}")
-            print(f"Body:\n{body}")
-            print("✅ OTP email logged (use the OTP above for confirmation)")
-
-        return True
-
-    except Exception as e:
-        print(f"❌ Error sending OTP email to {user_email}: {e}")
-        return False
+    return send_system_email('email_confirmation_otp', user_email, 'OTP email', user_name=user_name, otp=otp)
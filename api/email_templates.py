@@ -0,0 +1,135 @@
+import functools
+import quopri
+import string
+import textwrap
+from email.header import Header
+
+# Registry of the app's email templates.
+#
+# Each template is parsed once (on first use, then memoized) into a list of
+# literal chunks and (field, format spec) slots, so rendering is a single
+# join. render_message() produces the finished RFC 5322 message as bytes,
+# ready to hand to smtplib/aiosmtplib, without building a MIME object tree.
+
+_CREDENTIALS_CHECK_BODY = """
+        Hello!
+
+        This is a test email from the Reminder App to verify your email credentials are working correctly.
+
+        If you received this email, your settings are configured properly.
+
+        ---
+        This is an automated test email from the Reminder App.
+        """
+
+TEMPLATES = {
+    'reminder': (
+        "Reminder: {title}",
+        """
+        Hello!
+
+        This is a reminder for: {title}
+
+        Description: {description}
+
+        Scheduled Time: {reminder_time:%Y-%m-%d %H:%M}
+
+        ---
+        This is an automated reminder from the Reminder App.
+        """),
+    'password_reset': (
+        "Password Reset for Reminder App",
+        """
+        Hello {user_name},
+
+        You requested a password reset for your Reminder App account.
+
+        Click the link below to reset your password:
+        {reset_link}
+
+        This link will expire in 1 hour.
+
+        If you didn't request this, please ignore this email.
+
+        ---
+        This is an automated email from the Reminder App.
+        """),
+    'email_confirmation_otp': (
+        "Email Confirmation Code for Reminder App",
+        """
+        Hello {user_name},
+
+        Your OTP for email confirmation is: {otp}
+
+        This code expires in 5 minutes.
+
+        ---
+        This is an automated email from the Reminder App.
+        """),
+    'test_email': (
+        "Test Email from Reminder App",
+        _CREDENTIALS_CHECK_BODY),
+    'credentials_verification': (
+        "Email Credentials Verification",
+        _CREDENTIALS_CHECK_BODY),
+    'verify_email': (
+        "Verify Your Email",
+        "Click the link to verify your email: {verify_url}"),
+}
+
+
+class CompiledTemplate:
+    __slots__ = ('pieces',)
+
+    def __init__(self, text):
+        # [(literal, field_name or None, format_spec)]
+        self.pieces = [(literal, field, spec) for literal, field, spec, _ in string.Formatter().parse(text)]
+
+    def render(self, context):
+        out = []
+        for literal, field, spec in self.pieces:
+            out.append(literal)
+            if field is not None:
+                value = context[field]
+                out.append(format(value, spec) if spec else str(value))
+        return ''.join(out)
+
+
+@functools.lru_cache(maxsize=None)
+def get_template(name):
+    """Compiled (subject, body) for a registered template"""
+    subject, body = TEMPLATES[name]
+    return CompiledTemplate(subject), CompiledTemplate(textwrap.dedent(body).strip('\n') + '\n')
+
+
+def render(name, **context):
+    """Render a template to (subject, body) text"""
+    subject, body = get_template(name)
+    return subject.render(context), body.render(context)
+
+
+def _header_value(value):
+    # No header injection through user-provided titles
+    value = value.replace('\r', ' ').replace('\n', ' ')
+    if value.isascii():
+        return value
+    # Long values are folded; keep the fold CRLF like the rest of the message
+    return Header(value, 'utf-8').encode(linesep='\r\n')
+
+
+def render_message(name, sender, recipient, **context):
+    """Render a template into a complete text/plain message as bytes"""
+    subject, body = render(name, **context)
+    payload = body.replace('\r\n', '\n').replace('\n', '\r\n').encode('utf-8')
+    if body.isascii() and all(len(line) <= 998 for line in body.split('\n')):
+        encoding = '7bit'
+    else:
+        payload = quopri.encodestring(payload)
+        encoding = 'quoted-printable'
+    headers = (f"From: {_header_value(sender)}\r\n"
+               f"To: {_header_value(recipient)}\r\n"
+               f"Subject: {_header_value(subject)}\r\n"
+               "MIME-Version: 1.0\r\n"
+               "Content-Type: text/plain; charset=\"utf-8\"\r\n"
+               f"Content-Transfer-Encoding: {encoding}\r\n\r\n")
+    return headers.encode('ascii') + payload
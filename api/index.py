@@ -1,21 +1,29 @@
 from flask import Flask, redirect, url_for, send_from_directory
 from flask_login import LoginManager
 from flask_mail import Mail
+import hmac
 import os
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.executors.pool import ThreadPoolExecutor, ProcessPoolExecutor
 from apscheduler.executors.asyncio import AsyncIOExecutor
 
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request, g, Response
+import time
 
+from api import metrics, profiler
 from api.auth import User, mail
 from api.csv_handler import get_user_by_id
 from api.email_service import check_and_send_reminders
+from api.reminder_timer import ReminderTimer
 
 # Initialize extensions
 login_manager = LoginManager()
 
+# At most one background scheduler per process; across processes the dispatcher
+# lease in api/leader.py makes sure only one of them sends reminders per tick
+scheduler = None
+
 def create_app():
     app = Flask(__name__, template_folder=os.path.join(os.path.dirname(__file__), '..', 'templates'))
 
@@ -39,9 +47,9 @@ def create_app():
         user_data = get_user_by_id(user_id)
         if user_data:
             return User(
-                id=user_data['id'],
-                email=user_data['email'],
-                password_hash=user_data['password_hash']
+                id=user_data.id,
+                email=user_data.email,
+                password_hash=user_data.password_hash
             )
         return None
 
@@ -68,6 +76,69 @@ def create_app():
         return send_from_directory(os.path.join(app.root_path, 'static'),
                                    'favicon.ico', mimetype='image/vnd.microsoft.icon')
 
+    if metrics.METRICS_ENABLED:
+        @app.before_request
+        def start_request_timer():
+            g.request_started = time.perf_counter()
+
+        @app.after_request
+        def record_request_latency(response):
+            started = g.pop('request_started', None)
+            if started is not None:
+                # Streamed bodies (CSV export) are timed up to the first byte
+                metrics.observe('http_request_duration_seconds', time.perf_counter() - started,
+                                route=request.endpoint or 'unmatched', method=request.method,
+                                status=response.status_code)
+            return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        if not metrics.METRICS_ENABLED:
+            return 'Metrics are disabled', 404
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.before_request
+    def start_request_profile():
+        if profiler.profiling_active():
+            g.request_profile = profiler.start('request', request.endpoint or 'unmatched')
+
+    @app.teardown_request
+    def finish_request_profile(exc):
+        profiler.finish(g.pop('request_profile', None))
+
+    def profiling_authorized():
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        return hmac.compare_digest(supplied.encode(), profiler.PROFILE_ADMIN_TOKEN.encode())
+
+    @app.route('/admin/profiling', methods=['GET', 'POST'])
+    def profiling_admin():
+        """Show or switch profiling: POST enabled=true|false, optional seconds=<duration>"""
+        if not profiler.PROFILE_ADMIN_TOKEN:
+            return 'Not found', 404
+        if not profiling_authorized():
+            return jsonify(error='unauthorized'), 401
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or request.form
+            if str(data.get('enabled', 'true')).lower() in ['true', '1', 't']:
+                seconds = data.get('seconds')
+                try:
+                    profiler.enable(float(seconds) if seconds else None)
+                except ValueError:
+                    return jsonify(error='seconds must be a number'), 400
+                print(f"🔍 Profiling enabled{f' for {seconds}s' if seconds else ''} in process {os.getpid()}")
+            else:
+                profiler.disable()
+                print(f"🔍 Profiling disabled in process {os.getpid()}")
+        return jsonify(profiler.status())
+
+    @app.route('/admin/profiling/<name>')
+    def profiling_download(name):
+        if not profiler.PROFILE_ADMIN_TOKEN:
+            return 'Not found', 404
+        if not profiling_authorized():
+            return jsonify(error='unauthorized'), 401
+        return send_from_directory(profiler.PROFILE_DIR, name, mimetype='text/plain')
+
     @app.route('/cron/reminders')
     def cron_reminders():
         print("🔄 Cron job /cron/reminders triggered")
@@ -83,11 +154,23 @@ def create_app():
     app.register_blueprint(reminders_bp)
 
     # Set up background scheduler for email reminders (only for local development, not Vercel)
+    global scheduler
     if os.environ.get('VERCEL'):
         print("⚠️ VERCEL environment detected - background scheduler disabled")
+    elif scheduler is not None:
+        print("⚠️ Background scheduler already running in this process")
     else:
         print("✅ Starting background scheduler for reminders")
         try:
+            if os.environ.get('SCHEDULER_MODE', 'interval').lower() == 'timer':
+                # Sleep until the earliest pending reminder instead of polling
+                scheduler = ReminderTimer(lambda: check_and_send_reminders(app))
+                scheduler.start()
+                print("✅ Reminder timer started - will wake at the next due reminder")
+                import atexit
+                atexit.register(scheduler.stop)
+                return app
+
             scheduler = BackgroundScheduler(executors={
                 'default': ThreadPoolExecutor(20),
                 'processpool': ProcessPoolExecutor(5)
@@ -117,8 +200,5 @@ def create_app():
 
     return app
 
-# For Vercel deployment
-app = create_app()
-
-# For Vercel deployment
+# For Vercel deployment (and run.py); create the app once per process
 app = create_app()
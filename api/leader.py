@@ -0,0 +1,71 @@
+import os
+import socket
+import time
+import uuid
+
+from api.local_db import connect, transaction
+from api.storage import DATA_DIR
+
+# Dispatcher leadership and per-reminder claims.
+#
+# Every process that imports the app may run a scheduler, and the Vercel cron
+# hits /cron/reminders on top of that. A tick first takes the dispatcher lease
+# (a row in a small SQLite database shared by all local processes), so only one
+# dispatcher runs at a time, even between threads of the same process: every
+# acquisition gets its own token and only that token releases it. Every
+# reminder is claimed with a random token before it is sent, so a reminder can
+# never be handed to two senders.
+# Leases and claims expire on their own, so a crashed process cannot block
+# dispatching for longer than their TTL.
+
+LEASE_DB = os.environ.get('LEASE_DB') or os.path.join(DATA_DIR, 'scheduler.db')
+DISPATCH_LEASE_TTL = int(os.environ.get('DISPATCH_LEASE_TTL', 240))
+REMINDER_CLAIM_TTL = int(os.environ.get('REMINDER_CLAIM_TTL', 600))
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL);
+    CREATE TABLE IF NOT EXISTS claims (reminder_id TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL);
+"""
+
+
+def _conn():
+    return connect(LEASE_DB, SCHEMA)
+
+
+def acquire_lease(name, ttl=DISPATCH_LEASE_TTL):
+    """Take the named lease, return the holder token to release it with, or None if someone else holds it"""
+    holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+    now = time.time()
+    with transaction(_conn()) as conn:
+        row = conn.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+        if row and row[1] > now:
+            return None
+        conn.execute("INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                     "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at",
+                     (name, holder, now + ttl))
+        return holder
+
+
+def release_lease(name, holder):
+    """Release the lease taken with holder; a lease that expired and was taken over is left alone"""
+    _conn().execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+
+def claim_reminder(reminder_id, ttl=REMINDER_CLAIM_TTL):
+    """Claim a reminder for sending, return the claim token or None if someone else holds it"""
+    conn = _conn()
+    token = uuid.uuid4().hex
+    now = time.time()
+    cursor = conn.execute(
+        "INSERT INTO claims (reminder_id, token, expires_at) VALUES (?, ?, ?) "
+        "ON CONFLICT(reminder_id) DO UPDATE SET token = excluded.token, expires_at = excluded.expires_at "
+        "WHERE claims.expires_at <= ?",
+        (reminder_id, token, now + ttl, now))
+    return token if cursor.rowcount else None
+
+
+def release_claims(claims):
+    """Release [(reminder_id, token), ...]; claims taken over by someone else are left alone"""
+    with transaction(_conn()) as conn:
+        conn.executemany("DELETE FROM claims WHERE reminder_id = ? AND token = ?", claims)
+        conn.execute("DELETE FROM claims WHERE expires_at <= ?", (time.time(),))
@@ -0,0 +1,45 @@
+import contextlib
+import os
+import sqlite3
+import threading
+
+# Small SQLite databases shared by all local processes (dispatcher lease and
+# claims, send rate buckets, outbox).
+#
+# Every thread gets its own connection per file, in autocommit mode with WAL
+# so readers never wait for the writer. Connections are not carried over a
+# fork(): a child opens fresh ones the first time it asks. Each module passes
+# its own schema, which runs once per connection.
+
+_local = threading.local()
+
+
+def connect(path, schema):
+    """Return this thread's connection to the database at path, creating schema if needed"""
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.conns = {}
+        _local.schemas = set()
+        _local.pid = os.getpid()
+    conn = _local.conns.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        _local.conns[path] = conn
+    if (path, schema) not in _local.schemas:
+        conn.executescript(schema)
+        _local.schemas.add((path, schema))
+    return conn
+
+
+@contextlib.contextmanager
+def transaction(conn):
+    """BEGIN IMMEDIATE ... COMMIT, rolled back if the block raises"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
@@ -0,0 +1,117 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# Concurrency helpers for the file-backed storage.
+#
+# The scheduler thread, the sender threads, every gunicorn worker and the cron
+# endpoint all touch the same data/ files. FileRWLock is a reader/writer lock
+# that works both between threads (a condition variable) and between processes
+# (flock on a side-car .lock file). atomic_write replaces a file through a
+# temp file + os.replace so readers never observe a half-written table.
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+
+class VersionConflict(Exception):
+    """The file changed between reading it and committing a write based on that read"""
+
+
+class FileRWLock:
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+        self._reset()
+
+    def _reset(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._owner = None  # thread holding the write lock
+        self._depth = 0
+        self._fd = None
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        # A forked child shares the parent's open file description, and flock on it would
+        # not exclude the two processes; start over with a descriptor of its own
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _flock(self, operation):
+        if fcntl is None:
+            return
+        if self._fd is None:
+            os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+            self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, operation)
+
+    @contextmanager
+    def read(self):
+        self._check_fork()
+        me = threading.get_ident()
+        if self._owner == me:
+            # Reading while holding the write lock
+            yield
+            return
+        with self._cond:
+            while self._owner is not None:
+                self._cond.wait()
+            if self._readers == 0:
+                self._flock(fcntl.LOCK_SH if fcntl else None)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._flock(fcntl.LOCK_UN if fcntl else None)
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        self._check_fork()
+        me = threading.get_ident()
+        with self._cond:
+            if self._owner != me:
+                while self._owner is not None or self._readers:
+                    self._cond.wait()
+                self._flock(fcntl.LOCK_EX if fcntl else None)
+                self._owner = me
+            self._depth += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._flock(fcntl.LOCK_UN if fcntl else None)
+                    self._owner = None
+                    self._cond.notify_all()
+
+
+def atomic_write(path, write, mode='w'):
+    """Write path via a temp file in the same directory, fsync it, then os.replace it into place"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        os.chmod(tmp_path, 0o644)  # mkstemp creates 0600 files
+        if 'b' in mode:
+            f = os.fdopen(fd, mode)
+        else:
+            f = os.fdopen(fd, mode, newline='', encoding='utf-8')
+        with f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
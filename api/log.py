@@ -0,0 +1,129 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+# Leveled, structured logging for the dispatch path.
+#
+# Every logger lives under "reminder_app" and writes through a bounded queue:
+# the calling thread only enqueues the record, a QueueListener thread formats
+# and writes it to stdout. If the queue is full the record is dropped and
+# counted instead of blocking the dispatcher. Per-reminder lines are DEBUG and
+# marked with extra=SAMPLED, so only LOG_DEBUG_SAMPLE_RATE of them are kept
+# even at DEBUG; at the default INFO level they are never even formatted and a
+# tick logs a fixed number of summary lines plus one per failure.
+#
+# LOG_FORMAT=json emits one JSON object per line, including any extra= fields
+# (reminder_id, sender, counts, ...), for log shippers.
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.1))
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+ROOT_LOGGER = 'reminder_app'
+
+# Pass as extra= on high-volume per-reminder DEBUG lines
+SAMPLED = {'sampled': True}
+
+_RESERVED = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime', 'sampled', 'taskName'}
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for name, value in record.__dict__.items():
+            if name not in _RESERVED:
+                entry[name] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SampleFilter(logging.Filter):
+    """Keep only a share of the records marked with extra=SAMPLED"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return not getattr(record, 'sampled', False) or random.random() < self.rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: records that do not fit are counted and dropped"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            if self.dropped:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': ROOT_LOGGER, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': f"⚠️ Log queue was full, dropped {self.dropped} records"}))
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+_handler = None
+
+
+def _start_listener():
+    global _listener
+    output = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == 'json':
+        output.setFormatter(JSONFormatter())
+    else:
+        output.setFormatter(logging.Formatter('%(asctime)s %(levelname)-7s %(message)s', '%Y-%m-%d %H:%M:%S'))
+    _listener = logging.handlers.QueueListener(_handler.queue, output, respect_handler_level=False)
+    _listener.start()
+
+
+def _after_fork():
+    # The listener thread does not survive fork(); start a fresh one with an empty queue
+    global _listener
+    if _handler is not None:
+        _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+        _start_listener()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def configure_logging():
+    """Install the queue handler on the app's root logger (idempotent)"""
+    global _handler
+    if _handler is not None:
+        return
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    root.propagate = False
+    _handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _handler.addFilter(SampleFilter(LOG_DEBUG_SAMPLE_RATE))
+    root.addHandler(_handler)
+    _start_listener()
+    atexit.register(_stop_listener)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_after_fork)
+
+
+def get_logger(name):
+    configure_logging()
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
@@ -0,0 +1,173 @@
+import bisect
+import functools
+import os
+import threading
+import time
+
+# In-process metrics in the Prometheus text exposition format.
+#
+# Enabled with METRICS_ENABLED=true; GET /metrics then returns every counter,
+# gauge and histogram below. When disabled, timed() and instrument() hand
+# back the original functions and the other helpers return immediately, so
+# instrumented code costs one flag check. Values are kept per process: with
+# several gunicorn workers each one reports its own series.
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'false').lower() in ['true', '1', 't']
+METRICS_PREFIX = 'reminder_app_'
+
+# Latency buckets in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRICS = {
+    'storage_operation_seconds': ('histogram', 'Time spent in csv_handler storage operations'),
+    'http_request_duration_seconds': ('histogram', 'Flask request latency by route'),
+    'smtp_operation_seconds': ('histogram', 'SMTP connect, login and send durations'),
+    'dispatcher_tick_seconds': ('histogram', 'Duration of one reminder dispatcher tick'),
+    'reminders_due_total': ('counter', 'Due reminders newly queued by the dispatcher'),
+    'reminders_sent_total': ('counter', 'Reminder emails sent'),
+    'reminders_failed_total': ('counter', 'Reminder sends that failed'),
+    'reminders_deferred_total': ('counter', 'Reminder sends deferred by the sender rate limit'),
+    'scheduler_lag_seconds': ('gauge', 'Age of the oldest reminder ready to send when the last tick started'),
+    'file_read_bytes_total': ('counter', 'Bytes read from the data files'),
+    'login_attempts_total': ('counter', 'Login attempts by result'),
+    'import_rows_total': ('counter', 'Rows seen by reminder CSV imports by result'),
+}
+
+_lock = threading.Lock()
+_values = {}  # (name, labels) -> float for counters and gauges
+_histograms = {}  # (name, labels) -> [count per bucket..., count above the last bucket, sum]
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        _values[_key(name, labels)] = value
+
+
+def observe(name, seconds, **labels):
+    """Record one duration in a histogram"""
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        histogram[bisect.bisect_left(BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+
+
+class _Timer:
+    __slots__ = ('name', 'labels', 'start')
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name, **labels):
+    """Context manager observing the duration of its block"""
+    return _Timer(name, labels) if METRICS_ENABLED else _NULL_TIMER
+
+
+def timed(name, **labels):
+    """Decorator observing every call; returns the function unchanged when metrics are off"""
+    def decorator(fn):
+        if not METRICS_ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start, **labels)
+        return wrapper
+    return decorator
+
+
+def instrument(namespace, name, label, exclude=()):
+    """Wrap the public functions defined in a module namespace (its globals()) with timed()"""
+    if not METRICS_ENABLED:
+        return
+    module = namespace['__name__']
+    for attr, value in list(namespace.items()):
+        if (callable(value) and getattr(value, '__module__', None) == module and not attr.startswith('_')
+                and not isinstance(value, type) and attr not in exclude):
+            namespace[attr] = timed(name, **{label: attr})(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def render():
+    """All series in the Prometheus text format (version 0.0.4)"""
+    with _lock:
+        values = dict(_values)
+        histograms = {key: list(histogram) for key, histogram in _histograms.items()}
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        full = METRICS_PREFIX + name
+        lines.append(f'# HELP {full} {help_text}')
+        lines.append(f'# TYPE {full} {kind}')
+        if kind == 'histogram':
+            for (series, labels), histogram in sorted(histograms.items()):
+                if series != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram):
+                    cumulative += count
+                    lines.append(f'{full}_bucket{_labels(labels, [("le", repr(bound))])} {cumulative}')
+                cumulative += histogram[len(BUCKETS)]
+                lines.append(f'{full}_bucket{_labels(labels, [("le", "+Inf")])} {cumulative}')
+                lines.append(f'{full}_sum{_labels(labels)} {histogram[-1]}')
+                lines.append(f'{full}_count{_labels(labels)} {cumulative}')
+        else:
+            for (series, labels), value in sorted(values.items()):
+                if series == name:
+                    lines.append(f'{full}{_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
@@ -0,0 +1,149 @@
+import csv
+import io
+import mmap
+import os
+
+from api import metrics
+
+# Memory-mapped, read-only access to a CSV table by key.
+#
+# MappedCSV maps the file and keeps a side index of key -> (start, end) byte
+# range of each row. Building the index only scans for row boundaries (a
+# newline with an even number of quotes before it, so quoted multi-line
+# descriptions stay in one row) and reads the leading key column. Nothing else
+# is decoded: get() seeks to one row and parses just that row. When the file
+# only grew (same inode, appended rows) the index is extended from the old end
+# instead of being rebuilt. find_lines() does the same for JSON-lines logs.
+
+
+def _mapped(f):
+    size = os.fstat(f.fileno()).st_size
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+
+def _parse_row(data):
+    return next(csv.reader(io.StringIO(data.decode('utf-8'), newline='')), [])
+
+
+class MappedCSV:
+    def __init__(self, path, key='id'):
+        self.path = path
+        self.key = key
+        self._file = None
+        self._map = None
+        self._signature = None
+        self._header = None
+        self._key_column = 0
+        self._offsets = {}  # key -> (start, end)
+        self._indexed = 0   # bytes of the file covered by the index
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+        self._file = self._map = self._signature = self._header = None
+        self._offsets = {}
+        self._indexed = 0
+
+    def _row_end(self, start):
+        """End offset (past the newline) of the row starting at start"""
+        mm = self._map
+        pos = start
+        quotes = 0
+        while True:
+            newline = mm.find(b'\n', pos)
+            if newline < 0:
+                return len(mm)
+            quotes += mm[pos:newline].count(b'"')
+            if quotes % 2 == 0:
+                return newline + 1
+            pos = newline + 1
+
+    def _key_of(self, start, end):
+        mm = self._map
+        if self._key_column == 0 and mm[start:start + 1] != b'"':
+            comma = mm.find(b',', start, end)
+            return mm[start:comma if comma >= 0 else end].rstrip(b'\r\n').decode('utf-8')
+        row = _parse_row(mm[start:end])
+        return row[self._key_column] if len(row) > self._key_column else None
+
+    def _index_from(self, start):
+        size = len(self._map)
+        while start < size:
+            end = self._row_end(start)
+            if end == size and self._map[end - 1:end] != b'\n':
+                break  # unterminated last row, picked up once the append completes
+            key = self._key_of(start, end)
+            if key:
+                self._offsets[key] = (start, end)
+            start = end
+        self._indexed = start
+
+    def refresh(self):
+        """Remap the file if it changed; only the appended tail is indexed when it just grew"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self.close()
+            return
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if signature == self._signature:
+            return
+        grew = (self._signature is not None and self._map is not None and
+                st.st_ino == self._signature[0] and st.st_size > self._indexed)
+        if grew:
+            self._map.close()
+            self._map = _mapped(self._file)
+            self._index_from(self._indexed)
+        else:
+            self.close()
+            self._file = open(self.path, 'rb')
+            self._map = _mapped(self._file)
+            if self._map is not None:
+                header_end = self._row_end(0)
+                self._header = _parse_row(self._map[:header_end])
+                self._key_column = self._header.index(self.key) if self.key in self._header else 0
+                self._index_from(header_end)
+        self._signature = signature
+
+    def __contains__(self, key):
+        self.refresh()
+        return key in self._offsets
+
+    def __len__(self):
+        self.refresh()
+        return len(self._offsets)
+
+    def get(self, key):
+        """Return the row for key as a dict, or None"""
+        self.refresh()
+        span = self._offsets.get(key)
+        if span is None:
+            return None
+        metrics.inc('file_read_bytes_total', span[1] - span[0], file=os.path.basename(self.path))
+        return dict(zip(self._header, _parse_row(self._map[span[0]:span[1]])))
+
+
+def find_lines(path, needle, start=0):
+    """Yield the complete lines of path (from byte offset start) that contain needle.
+
+    A trailing line without a newline is a torn append and is skipped.
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        mm = _mapped(f)
+        if mm is None:
+            return
+        with mm:
+            pos = mm.find(needle, start)
+            while pos >= 0:
+                line_start = mm.rfind(b'\n', start, pos) + 1
+                line_end = mm.find(b'\n', pos)
+                if line_end < 0:
+                    return
+                yield mm[max(line_start, start):line_end]
+                pos = mm.find(needle, line_end + 1)
@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+
+from api.local_db import connect, transaction
+from api.log import get_logger
+from api.storage import DATA_DIR
+
+# Durable outbound queue between "reminder is due" and "SMTP send".
+#
+# Every tick upserts the due reminders that are new to the outbox (each process
+# remembers what it already queued, so reminders that stay due while backing
+# off or dead-lettered are not written again), then drains only the entries
+# whose next attempt is due.
+# A failed send bumps the entry's attempt count and pushes its next attempt out
+# exponentially (doubling from OUTBOX_BACKOFF_BASE up to OUTBOX_BACKOFF_MAX),
+# so a broken account costs nothing on the scans in between. After
+# OUTBOX_MAX_ATTEMPTS failures, or at once for permanent errors such as a
+# deleted user, the entry is dead-lettered and left alone until the reminder
+# is rescheduled or requeue_dead() is called.
+
+OUTBOX_DB = os.environ.get('OUTBOX_DB') or os.path.join(DATA_DIR, 'outbox.db')
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8))
+OUTBOX_BACKOFF_BASE = int(os.environ.get('OUTBOX_BACKOFF_BASE', 60))
+OUTBOX_BACKOFF_MAX = int(os.environ.get('OUTBOX_BACKOFF_MAX', 6 * 3600))
+OUTBOX_RETENTION = int(os.environ.get('OUTBOX_RETENTION', 7 * 24 * 3600))
+
+QUEUED, SENT, DEAD = 'queued', 'sent', 'dead'
+
+log = get_logger('outbox')
+
+# reminder_id -> reminder_time of the queued and dead entries this process has put in the outbox
+_known = {}
+_known_lock = threading.Lock()
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS outbox (
+        reminder_id TEXT PRIMARY KEY,
+        reminder_time TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        last_error TEXT NOT NULL DEFAULT '',
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_outbox_ready ON outbox (status, next_attempt_at);
+"""
+
+
+def _conn():
+    return connect(OUTBOX_DB, SCHEMA)
+
+
+def backoff_delay(attempts):
+    """Seconds to wait before the next try after the given number of failed attempts"""
+    return min(OUTBOX_BACKOFF_BASE * 2 ** max(attempts - 1, 0), OUTBOX_BACKOFF_MAX)
+
+
+def enqueue(reminders):
+    """Queue due reminders for sending.
+
+    Reminders already in the outbox are left as they are, unless their
+    reminder_time changed since (the user rescheduled it), in which case the
+    entry starts over with a clean attempt count. Returns the ids that were written.
+    """
+    with _known_lock:
+        reminders = [reminder for reminder in reminders if _known.get(reminder.id) != reminder.reminder_time]
+    if not reminders:
+        return []
+    now = time.time()
+    with transaction(_conn()) as conn:
+        conn.executemany(
+            "INSERT INTO outbox (reminder_id, reminder_time, status, attempts, next_attempt_at, updated_at) "
+            "VALUES (?, ?, 'queued', 0, ?, ?) "
+            "ON CONFLICT(reminder_id) DO UPDATE SET reminder_time = excluded.reminder_time, status = 'queued', "
+            "attempts = 0, next_attempt_at = excluded.next_attempt_at, last_error = '', updated_at = excluded.updated_at "
+            "WHERE outbox.reminder_time != excluded.reminder_time",
+            [(reminder.id, reminder.reminder_time, now, now) for reminder in reminders])
+    with _known_lock:
+        _known.update((reminder.id, reminder.reminder_time) for reminder in reminders)
+    return [reminder.id for reminder in reminders]
+
+
+def ready(now=None, limit=500):
+    """Queued entries whose next attempt is due, oldest first"""
+    now = time.time() if now is None else now
+    return [dict(row) for row in _conn().execute(
+        "SELECT * FROM outbox WHERE status = 'queued' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+        (now, limit))]
+
+
+def oldest_ready_reminder_time(now=None):
+    """Earliest reminder_time (epoch) among the queued entries whose next attempt is due, or None"""
+    now = time.time() if now is None else now
+    return _conn().execute("SELECT MIN(CAST(reminder_time AS REAL)) FROM outbox "
+                           "WHERE status = 'queued' AND next_attempt_at <= ?", (now,)).fetchone()[0]
+
+
+def ids_with_status(reminder_ids, status=QUEUED):
+    """The subset of reminder_ids whose outbox entry has the given status"""
+    reminder_ids = list(reminder_ids)
+    found = set()
+    # Stay below SQLite's bound parameter limit
+    for start in range(0, len(reminder_ids), 500):
+        chunk = reminder_ids[start:start + 500]
+        found.update(row['reminder_id'] for row in _conn().execute(
+            f"SELECT reminder_id FROM outbox WHERE status = ? AND reminder_id IN ({','.join('?' * len(chunk))})",
+            [status] + chunk))
+    return found
+
+
+def parked():
+    """{reminder_id: epoch reminder_time} of the queued and dead entries; the outbox decides when they are sent"""
+    return {row['reminder_id']: float(row['reminder_time']) for row in _conn().execute(
+        "SELECT reminder_id, reminder_time FROM outbox WHERE status != 'sent'")}
+
+
+def next_attempt_time():
+    """Earliest next_attempt_at (epoch) of the queued entries, or None"""
+    return _conn().execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'queued'").fetchone()[0]
+
+
+def record_results(entries, sent_ids, failures, deferred=None, permanent=None):
+    """Mark sent_ids as sent and reschedule or dead-letter failures ({reminder_id: error}).
+
+    deferred ({reminder_id: seconds}) were never attempted (sender over its
+    rate limit) and are pushed back without using up an attempt. permanent
+    ({reminder_id: error}) cannot succeed by retrying and are dead-lettered
+    right away.
+    """
+    now = time.time()
+    attempts = {entry['reminder_id']: entry['attempts'] for entry in entries}
+    retries = []
+    dead = []
+    for reminder_id, error in failures.items():
+        count = attempts.get(reminder_id, 0) + 1
+        if count >= OUTBOX_MAX_ATTEMPTS:
+            dead.append((count, str(error), now, reminder_id))
+        else:
+            retries.append((count, now + backoff_delay(count), str(error), now, reminder_id))
+    for reminder_id, error in (permanent or {}).items():
+        dead.append((attempts.get(reminder_id, 0) + 1, str(error), now, reminder_id))
+
+    with transaction(_conn()) as conn:
+        conn.executemany("UPDATE outbox SET status = 'sent', updated_at = ? WHERE reminder_id = ?",
+                         [(now, reminder_id) for reminder_id in sent_ids])
+        conn.executemany("UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? "
+                         "WHERE reminder_id = ?", retries)
+        conn.executemany("UPDATE outbox SET status = 'dead', attempts = ?, last_error = ?, updated_at = ? "
+                         "WHERE reminder_id = ?", dead)
+        conn.executemany("UPDATE outbox SET next_attempt_at = ?, updated_at = ? WHERE reminder_id = ?",
+                         [(now + delay, now, reminder_id) for reminder_id, delay in (deferred or {}).items()])
+    # Sent reminders are completed and never due again, so stop remembering them
+    with _known_lock:
+        for reminder_id in sent_ids:
+            _known.pop(reminder_id, None)
+    for count, error, _, reminder_id in dead:
+        log.error("❌ Reminder %s dead-lettered after %d attempts: %s", reminder_id, count, error,
+                  extra={'reminder_id': reminder_id})
+    return len(retries), len(dead)
+
+
+def discard(reminder_ids):
+    """Drop entries whose reminder was deleted or completed elsewhere"""
+    reminder_ids = list(reminder_ids)
+    with _known_lock:
+        for reminder_id in reminder_ids:
+            _known.pop(reminder_id, None)
+    _conn().executemany("DELETE FROM outbox WHERE reminder_id = ?", [(reminder_id,) for reminder_id in reminder_ids])
+
+
+def purge_sent(retention=OUTBOX_RETENTION):
+    _conn().execute("DELETE FROM outbox WHERE status = 'sent' AND updated_at <= ?", (time.time() - retention,))
+
+
+def dead_letters(limit=100):
+    return [dict(row) for row in _conn().execute(
+        "SELECT * FROM outbox WHERE status = 'dead' ORDER BY updated_at DESC LIMIT ?", (limit,))]
+
+
+def requeue_dead(reminder_ids=None):
+    """Give dead-lettered entries (all of them by default) a fresh set of attempts"""
+    now = time.time()
+    sql = "UPDATE outbox SET status = 'queued', attempts = 0, next_attempt_at = ?, updated_at = ? WHERE status = 'dead'"
+    if reminder_ids is None:
+        return _conn().execute(sql, (now, now)).rowcount
+    return sum(_conn().execute(sql + " AND reminder_id = ?", (now, now, reminder_id)).rowcount
+               for reminder_id in reminder_ids)
+
+
+def stats():
+    counts = {QUEUED: 0, SENT: 0, DEAD: 0}
+    for row in _conn().execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status"):
+        counts[row['status']] = row['n']
+    return counts
@@ -0,0 +1,208 @@
+import collections
+import contextlib
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+from api.log import get_logger
+from api.storage import DATA_DIR
+
+# Opt-in sampling profiler for dispatcher ticks and slow requests.
+#
+# While profiling is on, every check_and_send_reminders tick and every Flask
+# request registers its thread with a sampler thread that records the
+# thread's Python stack every PROFILE_INTERVAL_MS. When the tick or request
+# took at least PROFILE_THRESHOLD_MS the samples are written to PROFILE_DIR
+# in the collapsed "folded stacks" format (one "frame;frame;frame count" line
+# per distinct stack), which flamegraph.pl, speedscope and inferno read
+# directly. Only the newest PROFILE_RETENTION profiles are kept.
+#
+# Turn it on with PROFILE_ENABLED=true, or at runtime through
+# /admin/profiling when PROFILE_ADMIN_TOKEN is set (per process: with several
+# gunicorn workers only the one serving the call switches). When off, each
+# tick or request costs one time comparison.
+
+PROFILE_ENABLED = os.environ.get('PROFILE_ENABLED', 'false').lower() in ['true', '1', 't']
+PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(DATA_DIR, 'profiles')
+PROFILE_THRESHOLD_MS = int(os.environ.get('PROFILE_THRESHOLD_MS', 500))
+PROFILE_INTERVAL_MS = int(os.environ.get('PROFILE_INTERVAL_MS', 10))
+PROFILE_RETENTION = int(os.environ.get('PROFILE_RETENTION', 50))
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN', '')
+
+log = get_logger('profiler')
+
+_active_until = float('inf') if PROFILE_ENABLED else 0.0
+
+_lock = threading.Lock()
+_captures = {}  # thread id -> _Capture
+_sampler = None
+
+
+class _Capture:
+    __slots__ = ('thread_id', 'kind', 'name', 'follow', 'started_at', 'started', 'stacks')
+
+    def __init__(self, kind, name, follow):
+        self.thread_id = threading.get_ident()
+        self.kind = kind
+        self.name = name
+        # Thread name prefixes (e.g. the send pool) sampled along with the capturing thread
+        self.follow = follow
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.stacks = collections.Counter()
+
+
+def profiling_active():
+    return time.time() < _active_until
+
+
+def enable(seconds=None):
+    """Profile from now on, or for the next `seconds` seconds"""
+    global _active_until
+    _active_until = float('inf') if seconds is None else time.time() + seconds
+
+
+def disable():
+    global _active_until
+    _active_until = 0.0
+
+
+def _fold(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    names.reverse()
+    return ';'.join(names)
+
+
+def _sample_loop():
+    global _sampler
+    interval = PROFILE_INTERVAL_MS / 1000
+    current = threading.current_thread()
+    while True:
+        time.sleep(interval)
+        with _lock:
+            if not _captures:
+                if _sampler is current:
+                    _sampler = None
+                return
+            frames = sys._current_frames()
+            names = None
+            for capture in _captures.values():
+                frame = frames.get(capture.thread_id)
+                if frame is not None:
+                    capture.stacks[_fold(frame)] += 1
+                if capture.follow:
+                    if names is None:
+                        names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    for ident, name in names.items():
+                        prefix = next((p for p in capture.follow if name.startswith(p)), None)
+                        if prefix is not None and ident in frames:
+                            capture.stacks[f'[{prefix}];{_fold(frames[ident])}'] += 1
+
+
+def start(kind, name, follow=()):
+    """Begin sampling the calling thread; returns None when profiling is off or already capturing"""
+    global _sampler
+    if not profiling_active():
+        return None
+    capture = _Capture(kind, name, follow)
+    with _lock:
+        if capture.thread_id in _captures:
+            return None
+        _captures[capture.thread_id] = capture
+        # The sampler exits once idle and does not survive fork(); start one when needed
+        if _sampler is None or not _sampler.is_alive():
+            _sampler = threading.Thread(target=_sample_loop, name='profile-sampler', daemon=True)
+            _sampler.start()
+    return capture
+
+
+def finish(capture):
+    """Stop sampling; writes the profile if the block was slower than PROFILE_THRESHOLD_MS"""
+    if capture is None:
+        return None
+    with _lock:
+        _captures.pop(capture.thread_id, None)
+    elapsed_ms = (time.perf_counter() - capture.started) * 1000
+    if elapsed_ms < PROFILE_THRESHOLD_MS or not capture.stacks:
+        return None
+    try:
+        return _write(capture, elapsed_ms)
+    except OSError as e:
+        log.warning("❌ Could not write profile for %s %s: %s", capture.kind, capture.name, e)
+        return None
+
+
+def _write(capture, elapsed_ms):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = re.sub(r'[^A-Za-z0-9_.-]', '_', capture.name)
+    filename = (f"{capture.started_at.strftime('%Y%m%d-%H%M%S-%f')}-{capture.kind}-{name}"
+                f"-{elapsed_ms:.0f}ms-{os.getpid()}.folded")
+    path = os.path.join(PROFILE_DIR, filename)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        for stack, count in capture.stacks.most_common():
+            f.write(f'{stack} {count}\n')
+    os.replace(path + '.tmp', path)
+    _prune()
+    log.info("📋 Saved %s profile for %s (%.0fms, %d samples) to %s", capture.kind, capture.name, elapsed_ms,
+             sum(capture.stacks.values()), path)
+    return path
+
+
+def _prune():
+    profiles = list_profiles()
+    for entry in profiles[PROFILE_RETENTION:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, entry['name']))
+        except OSError:
+            pass
+
+
+def list_profiles():
+    """Saved profiles, newest first"""
+    try:
+        entries = [entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith('.folded')]
+    except FileNotFoundError:
+        return []
+    entries.sort(key=lambda entry: entry.name, reverse=True)
+    return [{'name': entry.name, 'bytes': entry.stat().st_size} for entry in entries]
+
+
+@contextlib.contextmanager
+def capture(kind, name, follow=()):
+    token = start(kind, name, follow)
+    try:
+        yield
+    finally:
+        finish(token)
+
+
+def profiled(kind, follow=()):
+    """Decorator capturing every call of the function while profiling is on"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not profiling_active():
+                return fn(*args, **kwargs)
+            with capture(kind, fn.__name__, follow):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def status():
+    return {
+        'active': profiling_active(),
+        'until': None if _active_until in (0.0, float('inf')) else datetime.fromtimestamp(_active_until).isoformat(),
+        'threshold_ms': PROFILE_THRESHOLD_MS,
+        'interval_ms': PROFILE_INTERVAL_MS,
+        'directory': PROFILE_DIR,
+        'profiles': list_profiles(),
+    }
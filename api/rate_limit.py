@@ -0,0 +1,70 @@
+import os
+import time
+
+from api.leader import LEASE_DB
+from api.local_db import connect, transaction
+from api.log import get_logger, SAMPLED
+
+# Per-sender token buckets for SMTP sends.
+#
+# Gmail app-password accounts have hard sending quotas, and hitting them gets
+# the account throttled for hours. Every sender address (a user's
+# email_credentials or SYSTEM_SENDER_EMAIL) gets two buckets: one refilling
+# SMTP_RATE_PER_MINUTE tokens per minute and one refilling SMTP_RATE_PER_DAY
+# tokens per day. A send takes a token from both or is deferred. The buckets
+# live next to the dispatcher lease in data/scheduler.db so all processes share
+# one budget per account. A limit of 0 disables that bucket.
+
+SMTP_RATE_PER_MINUTE = int(os.environ.get('SMTP_RATE_PER_MINUTE', 20))
+SMTP_RATE_PER_DAY = int(os.environ.get('SMTP_RATE_PER_DAY', 500))
+
+log = get_logger('rate_limit')
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rate_buckets (sender TEXT NOT NULL, period TEXT NOT NULL,
+        tokens REAL NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (sender, period));
+"""
+
+
+def _conn():
+    return connect(LEASE_DB, SCHEMA)
+
+
+def _buckets():
+    """(period name, capacity, refill seconds) for the enabled buckets"""
+    buckets = []
+    if SMTP_RATE_PER_MINUTE > 0:
+        buckets.append(('minute', SMTP_RATE_PER_MINUTE, 60))
+    if SMTP_RATE_PER_DAY > 0:
+        buckets.append(('day', SMTP_RATE_PER_DAY, 86400))
+    return buckets
+
+
+def acquire_or_wait_seconds(sender):
+    """Take one send token for sender, or say how long until one is available.
+
+    Returns 0 when a token was taken and the send may go ahead, otherwise the
+    number of seconds to wait (nothing is taken in that case).
+    """
+    buckets = _buckets()
+    if not buckets or not sender:
+        return 0
+    sender = sender.lower()
+    now = time.time()
+    with transaction(_conn()) as conn:
+        levels = []
+        wait = 0
+        for period, capacity, seconds in buckets:
+            row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE sender = ? AND period = ?",
+                               (sender, period)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * capacity / seconds)
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) * seconds / capacity)
+            levels.append((period, tokens))
+        if not wait:
+            conn.executemany("INSERT INTO rate_buckets (sender, period, tokens, updated_at) VALUES (?, ?, ?, ?) "
+                             "ON CONFLICT(sender, period) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                             [(sender, period, tokens - 1, now) for period, tokens in levels])
+    if wait:
+        log.debug("⏭️ Sender %s is over its sending budget, next send in %.0fs", sender, wait, extra=SAMPLED)
+    return wait
@@ -0,0 +1,114 @@
+import calendar
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from typing import Optional
+
+# Typed in-memory records for users and reminders.
+#
+# Storage still persists rows as strings (CSV, the reminder log, SQLite), but
+# everything it hands out is one of these records. They use __slots__ (no
+# per-instance dict) and are frozen, so the caches can share one instance with
+# every caller instead of copying. reminder_time is kept as integer seconds of
+# the naive wall-clock time (no timezone is stored anywhere), parsed once
+# when the row is loaded, and flags are real booleans.
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+_EPOCH = datetime(1970, 1, 1)
+
+USER_FIELDS = ['id', 'email', 'password_hash', 'is_email_confirmed', 'verification_token', 'reset_token', 'reset_token_expiry', 'profile_picture', 'bio', 'email_credentials', 'app_password']
+REMINDER_FIELDS = ['id', 'user_id', 'title', 'description', 'reminder_time', 'recipient_email', 'is_completed']
+
+
+def to_epoch(value):
+    """Stored 'YYYY-MM-DD HH:MM:SS' text or a naive datetime -> int seconds, None if it does not parse"""
+    if isinstance(value, datetime):
+        return calendar.timegm(value.timetuple())
+    try:
+        return calendar.timegm(datetime.fromisoformat(value).timetuple())
+    except (TypeError, ValueError):
+        return None
+
+
+def from_epoch(epoch):
+    return None if epoch is None else _EPOCH + timedelta(seconds=epoch)
+
+
+def format_epoch(epoch):
+    return '' if epoch is None else from_epoch(epoch).strftime(TIME_FORMAT)
+
+
+def _flag(value):
+    return value is True or value == 'True'
+
+
+@dataclass(frozen=True)
+class Reminder:
+    __slots__ = tuple(REMINDER_FIELDS)
+    id: str
+    user_id: str
+    title: str
+    description: str
+    reminder_time: Optional[int]
+    recipient_email: str
+    is_completed: bool
+
+    _CONVERT = {'reminder_time': to_epoch, 'is_completed': _flag}
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*(cls._CONVERT.get(name, _text)(row.get(name)) for name in REMINDER_FIELDS))
+
+    def to_row(self):
+        row = {name: getattr(self, name) for name in REMINDER_FIELDS}
+        row['reminder_time'] = format_epoch(self.reminder_time)
+        row['is_completed'] = str(self.is_completed)
+        return row
+
+    def with_fields(self, fields):
+        """Copy with stored (string) field values applied, as written by update_reminder"""
+        return replace(self, **{name: self._CONVERT.get(name, _text)(value)
+                                for name, value in fields.items() if name in REMINDER_FIELDS})
+
+    @property
+    def due_at(self):
+        """reminder_time as a naive datetime"""
+        return from_epoch(self.reminder_time)
+
+    @property
+    def reminder_time_text(self):
+        return format_epoch(self.reminder_time)
+
+
+@dataclass(frozen=True)
+class User:
+    __slots__ = tuple(USER_FIELDS)
+    id: str
+    email: str
+    password_hash: str
+    is_email_confirmed: bool
+    verification_token: str
+    reset_token: str
+    reset_token_expiry: str
+    profile_picture: str
+    bio: str
+    email_credentials: str
+    app_password: str
+
+    _CONVERT = {'is_email_confirmed': _flag}
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*(cls._CONVERT.get(name, _text)(row.get(name)) for name in USER_FIELDS))
+
+    def to_row(self):
+        row = {name: getattr(self, name) for name in USER_FIELDS}
+        row['is_email_confirmed'] = str(self.is_email_confirmed)
+        return row
+
+    def with_fields(self, fields):
+        return replace(self, **{name: self._CONVERT.get(name, _text)(value)
+                                for name, value in fields.items() if name in USER_FIELDS})
+
+
+def _text(value):
+    return '' if value is None else str(value)
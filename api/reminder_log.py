@@ -0,0 +1,343 @@
+import csv
+import json
+import os
+import threading
+import time
+
+from api import metrics
+from api.columnar_index import ColumnarDueIndex, columnar_index_enabled
+from api.due_index import DueIndex
+from api.locking import FileRWLock, atomic_write
+from api.log import get_logger
+from api.mmap_reader import MappedCSV, find_lines
+from api.records import Reminder, to_epoch, from_epoch
+from api.reminder_query import UserTimelines
+
+# Append-only mutation log for the CSV reminders table.
+#
+# reminders.csv is a snapshot; every insert/update/delete since the last
+# compaction is appended as one JSON line to reminders.log and replayed on read.
+# A single-row change therefore costs one small append instead of a rewrite of
+# the whole table. The compactor folds the log back into the snapshot once it
+# grows past LOG_MAX_BYTES or its oldest entry is older than LOG_MAX_AGE seconds.
+#
+# The replayed table is kept in memory as Reminder records, indexed by id, by user_id, by user and
+# time for paging (api/reminder_query.py) and by due time for pending reminders
+# (api/due_index.py, or api/columnar_index.py with REMINDER_DUE_INDEX=numpy).
+# It is only re-read when the snapshot is replaced or the
+# log grows, so steady-state reads do no CSV parsing at all. A single-row
+# fetch while the table is not loaded (or was replaced by another process's
+# compaction) does not reload it either: get() seeks to the row through a
+# memory-mapped id -> offset index of the snapshot (api/mmap_reader.py) and
+# replays only the log records for that id.
+#
+# Replaying a record twice is harmless (insert overwrites, update/delete are
+# idempotent), so a crash at any point of a compaction only costs a re-replay.
+
+LOG_MAX_BYTES = int(os.environ.get('REMINDER_LOG_MAX_BYTES', 1024 * 1024))
+LOG_MAX_AGE = int(os.environ.get('REMINDER_LOG_MAX_AGE', 3600))
+COMPACT_INTERVAL = int(os.environ.get('REMINDER_LOG_COMPACT_INTERVAL', 60))
+
+log = get_logger('reminder_log')
+
+
+def _apply_to(reminder, record):
+    """Apply one log record to a single row (None when absent)"""
+    op = record.get('op')
+    if op == 'insert':
+        return Reminder.from_row(record['row'])
+    if op == 'update' and reminder is not None:
+        return reminder.with_fields(record['fields'])
+    if op == 'delete':
+        return None
+    return reminder
+
+
+class ReminderLog:
+    def __init__(self, snapshot_path, fieldnames):
+        self.snapshot_path = snapshot_path
+        self.log_path = snapshot_path.rsplit('.', 1)[0] + '.log'
+        # Log being folded into the snapshot by a compaction; replayed before log_path
+        self.pending_path = self.log_path + '.compacting'
+        self.fieldnames = fieldnames
+        self._lock = threading.RLock()
+        # Serialises appends and compactions across processes (see api/locking.py)
+        self.file_lock = FileRWLock(snapshot_path.rsplit('.', 1)[0] + '.lock')
+        self._rows = None
+        self._by_user = {}
+        self._timelines = UserTimelines()
+        self._due = ColumnarDueIndex() if columnar_index_enabled() else DueIndex()
+        self._snapshot = MappedCSV(snapshot_path)
+        self._signature = None
+        self._log_offset = 0
+        self._log_started = None
+        self._compactor = None
+
+    # State
+
+    def _stat_signature(self):
+        signature = []
+        for path in (self.snapshot_path, self.pending_path):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_ino, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _index(self, reminder):
+        self._rows[reminder.id] = reminder
+        self._by_user.setdefault(reminder.user_id, {})[reminder.id] = reminder
+        self._timelines.add(reminder)
+        self._due.add(reminder)
+
+    def _unindex(self, reminder):
+        user_rows = self._by_user.get(reminder.user_id)
+        if user_rows is not None:
+            user_rows.pop(reminder.id, None)
+            if not user_rows:
+                del self._by_user[reminder.user_id]
+        self._timelines.discard(reminder)
+        self._due.discard(reminder.id)
+
+    def _apply(self, record):
+        op = record.get('op')
+        reminder_id = record.get('id')
+        old = self._rows.get(reminder_id)
+        if op == 'insert':
+            if old is not None:
+                self._unindex(old)
+            self._index(Reminder.from_row(record['row']))
+        elif op == 'update':
+            if old is not None:
+                self._unindex(old)
+                self._index(old.with_fields(record['fields']))
+        elif op == 'delete':
+            if old is not None:
+                self._unindex(old)
+                del self._rows[reminder_id]
+        if self._log_started is None:
+            self._log_started = record.get('ts', time.time())
+
+    def _replay(self, path, offset=0):
+        """Apply complete records from path starting at offset, return the new offset"""
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        metrics.inc('file_read_bytes_total', len(data), file=os.path.basename(path))
+        # A missing trailing newline means the last append was torn; leave it for later
+        end = data.rfind(b'\n') + 1
+        corrupt = []
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, KeyError):
+                corrupt.append(line)
+        if corrupt:
+            # One line per replay, however many records were bad
+            log.warning("⚠️ Skipped %d corrupt reminder log records in %s (first: %r)", len(corrupt),
+                        os.path.basename(path), corrupt[0][:80])
+        return offset + end
+
+    def _reload(self):
+        self._rows = {}
+        self._by_user = {}
+        self._timelines.clear()
+        self._due.clear()
+        self._log_started = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    self._index(Reminder.from_row(row))
+                metrics.inc('file_read_bytes_total', os.fstat(f.fileno()).st_size, file=os.path.basename(self.snapshot_path))
+        self._replay(self.pending_path)
+        self._log_offset = self._replay(self.log_path)
+        self._signature = self._stat_signature()
+
+    def _refresh(self):
+        """Bring the in-memory table up to date, replaying only the new tail of the log"""
+        if self._rows is None or self._stat_signature() != self._signature:
+            with self.file_lock.read():
+                self._reload()
+            return
+        try:
+            size = os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            size = 0
+        if size != self._log_offset:
+            with self.file_lock.read():
+                if size < self._log_offset:
+                    self._reload()
+                else:
+                    self._log_offset = self._replay(self.log_path, self._log_offset)
+
+    def rows(self):
+        """Return the current table as a dict of id -> row"""
+        with self._lock:
+            self._refresh()
+            return self._rows
+
+    def get(self, reminder_id):
+        """Return one row by id, or None"""
+        with self._lock:
+            if self._rows is not None and self._stat_signature() == self._signature:
+                self._refresh()
+                return self._rows.get(reminder_id)
+            with self.file_lock.read():
+                row = self._snapshot.get(reminder_id)
+                reminder = Reminder.from_row(row) if row is not None else None
+                needle = b'"id":' + json.dumps(reminder_id).encode('utf-8')
+                for path in (self.pending_path, self.log_path):
+                    for line in find_lines(path, needle):
+                        try:
+                            record = json.loads(line)
+                            if record.get('id') == reminder_id:
+                                reminder = _apply_to(reminder, record)
+                        except (ValueError, KeyError):
+                            continue
+                return reminder
+
+    def rows_for_user(self, user_id):
+        """Return the rows belonging to user_id, in insertion order"""
+        with self._lock:
+            self._refresh()
+            return list(self._by_user.get(user_id, {}).values())
+
+    def query_user(self, user_id, status=None, start=None, end=None, after=None, limit=25):
+        with self._lock:
+            self._refresh()
+            ids = self._timelines.query(user_id, status, start, end, after, limit)
+            return [self._rows[reminder_id] for reminder_id in ids]
+
+    def counts_for_user(self, user_id):
+        with self._lock:
+            self._refresh()
+            return self._timelines.counts(user_id)
+
+    def due_rows(self, now):
+        """Return the pending rows due at or before now (a datetime), earliest first"""
+        with self._lock:
+            self._refresh()
+            return [self._rows[reminder_id] for reminder_id in self._due.due(to_epoch(now))]
+
+    def due_rows_by_user(self, now):
+        """Return {user_id: [due rows, earliest first]} for the pending rows due at or before now"""
+        with self._lock:
+            self._refresh()
+            if isinstance(self._due, ColumnarDueIndex):
+                groups = self._due.due_by_user(to_epoch(now))
+            else:
+                groups = {}
+                for reminder_id in self._due.due(to_epoch(now)):
+                    groups.setdefault(self._rows[reminder_id].user_id, []).append(reminder_id)
+            return {user_id: [self._rows[reminder_id] for reminder_id in ids] for user_id, ids in groups.items()}
+
+    def next_due_time(self, skip=None):
+        with self._lock:
+            self._refresh()
+            return from_epoch(self._due.peek(skip))
+
+    # Mutations
+
+    def append(self, op, reminder_id, **payload):
+        self.append_many([dict(op=op, id=reminder_id, **payload)])
+
+    def append_many(self, records):
+        """Append records with a single write and fsync"""
+        now = time.time()
+        records = [dict(record, ts=now) for record in records]
+        data = b''.join((json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8') for record in records)
+        with self._lock, self.file_lock.write():
+            # Catch up with other writers first, anything left past our offset is a torn record
+            self._refresh()
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            with open(self.log_path, 'ab') as f:
+                if f.tell() > self._log_offset:
+                    # Terminate a torn record so it cannot swallow this one
+                    self._log_offset = f.tell() + 1
+                    f.write(b'\n')
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            for record in records:
+                self._apply(record)
+            self._log_offset += len(data)
+        self.start_compactor()
+
+    def insert(self, row):
+        self.append('insert', row['id'], row=row)
+
+    def update(self, reminder_id, fields):
+        with self._lock, self.file_lock.write():
+            if reminder_id not in self.rows():
+                return False
+            self.append('update', reminder_id, fields=fields)
+            return True
+
+    def apply_changes(self, inserts, updates):
+        """Append inserts and updates of existing rows as one write, return (inserted, updated)"""
+        with self._lock, self.file_lock.write():
+            rows = self.rows()
+            update_records = [dict(op='update', id=reminder_id, fields=fields) for reminder_id, fields in updates if reminder_id in rows]
+            records = [dict(op='insert', id=row['id'], row=row) for row in inserts] + update_records
+            if records:
+                self.append_many(records)
+            return len(inserts), len(update_records)
+
+    def delete(self, reminder_id):
+        with self._lock, self.file_lock.write():
+            if reminder_id not in self.rows():
+                return False
+            self.append('delete', reminder_id)
+            return True
+
+    # Compaction
+
+    def needs_compaction(self):
+        try:
+            size = os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            return False
+        if size >= LOG_MAX_BYTES:
+            return True
+        return size > 0 and self._log_started is not None and time.time() - self._log_started >= LOG_MAX_AGE
+
+    def compact(self):
+        """Fold the log into a fresh snapshot written via temp file + rename"""
+        with self._lock, self.file_lock.write():
+            self._refresh()
+            if os.path.exists(self.log_path) and not os.path.exists(self.pending_path):
+                # New appends from here on go to a fresh log
+                os.replace(self.log_path, self.pending_path)
+            self._reload()
+
+            def write_snapshot(f):
+                writer = csv.DictWriter(f, fieldnames=self.fieldnames, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(reminder.to_row() for reminder in self._rows.values())
+            atomic_write(self.snapshot_path, write_snapshot)
+            if os.path.exists(self.pending_path):
+                os.remove(self.pending_path)
+            self._reload()
+
+    def _compact_loop(self):
+        while True:
+            time.sleep(COMPACT_INTERVAL)
+            try:
+                if self.needs_compaction():
+                    self.compact()
+            except Exception as e:
+                log.error("❌ Reminder log compaction failed: %s", e, exc_info=True)
+
+    def start_compactor(self):
+        if self._compactor is not None:
+            return
+        with self._lock:
+            if self._compactor is None:
+                self._compactor = threading.Thread(target=self._compact_loop, name='reminder-log-compactor', daemon=True)
+                self._compactor.start()
@@ -0,0 +1,102 @@
+import bisect
+import heapq
+
+# Per-user ordering and counters used by the paginated dashboard query.
+#
+# Reminders are kept in one sorted list of (reminder_time, id) per user and
+# status, with reminder_time in epoch seconds, so a page is found with a bisect and read in O(page size). Totals are
+# maintained counters updated on every add/discard instead of being counted.
+
+STATUSES = ('pending', 'completed')
+
+
+def reminder_status(reminder):
+    return 'completed' if reminder.is_completed else 'pending'
+
+
+def _sort_key(reminder):
+    # Reminders without a usable time sort first
+    return (reminder.reminder_time or 0, reminder.id)
+
+
+def encode_cursor(reminder):
+    """Opaque cursor pointing just after reminder in (reminder_time, id) order"""
+    return "%d|%s" % _sort_key(reminder)
+
+
+def decode_cursor(cursor):
+    if not cursor or '|' not in cursor:
+        return None
+    reminder_time, reminder_id = cursor.split('|', 1)
+    try:
+        return (int(reminder_time), reminder_id)
+    except ValueError:
+        return None
+
+
+def empty_counts():
+    return {'total': 0, 'pending': 0, 'completed': 0, 'with_email': 0}
+
+
+class UserTimelines:
+    def __init__(self):
+        self._timelines = {}  # (user_id, status) -> sorted [(reminder_time, id)]
+        self._counts = {}     # user_id -> counters
+
+    def clear(self):
+        self._timelines = {}
+        self._counts = {}
+
+    def _adjust(self, reminder, delta):
+        counts = self._counts.setdefault(reminder.user_id, empty_counts())
+        counts['total'] += delta
+        counts[reminder_status(reminder)] += delta
+        if reminder.recipient_email:
+            counts['with_email'] += delta
+        if not counts['total']:
+            del self._counts[reminder.user_id]
+
+    def add(self, reminder):
+        timeline = self._timelines.setdefault((reminder.user_id, reminder_status(reminder)), [])
+        bisect.insort(timeline, _sort_key(reminder))
+        self._adjust(reminder, 1)
+
+    def discard(self, reminder):
+        timeline = self._timelines.get((reminder.user_id, reminder_status(reminder)))
+        if not timeline:
+            return
+        key = _sort_key(reminder)
+        i = bisect.bisect_left(timeline, key)
+        if i < len(timeline) and timeline[i] == key:
+            del timeline[i]
+            self._adjust(reminder, -1)
+
+    def counts(self, user_id):
+        return dict(self._counts.get(user_id) or empty_counts())
+
+    def query(self, user_id, status=None, start=None, end=None, after=None, limit=25):
+        """Return up to limit reminder ids in (reminder_time, id) order.
+
+        start/end are inclusive epoch-second bounds, after is a decoded cursor.
+        """
+        if after and after >= (start or 0, ''):
+            lower, find = after, bisect.bisect_right
+        else:
+            lower, find = (start or 0, ''), bisect.bisect_left
+        streams = []
+        for name in ((status,) if status in STATUSES else STATUSES):
+            timeline = self._timelines.get((user_id, name), [])
+            streams.append(_iter_from(timeline, find(timeline, lower)))
+        ids = []
+        for reminder_time, reminder_id in heapq.merge(*streams):
+            if end is not None and reminder_time > end:
+                break
+            ids.append(reminder_id)
+            if len(ids) >= limit:
+                break
+        return ids
+
+
+def _iter_from(timeline, i):
+    for j in range(i, len(timeline)):
+        yield timeline[j]
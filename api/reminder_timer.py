@@ -0,0 +1,109 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+from api import outbox
+from api.csv_handler import get_next_due_time, add_reminder_listener
+from api.log import get_logger
+
+# Event-driven alternative to polling every 5 minutes (SCHEDULER_MODE=timer).
+#
+# A single thread sleeps until the dispatcher next has work and runs
+# check_and_send_reminders right then: the earliest pending reminder_time
+# that is not already in the outbox, or the outbox's earliest retry. Reminders
+# that are dead-lettered or backing off never hold it up.
+# add_reminder/update_reminder/imports in this process wake it early when
+# they introduce an earlier deadline. Changes made by other processes are
+# picked up after at most TIMER_MAX_SLEEP seconds. When another dispatcher
+# holds the lease (or the tick failed) it waits TIMER_RETRY_DELAY seconds
+# before trying again instead of spinning.
+
+TIMER_MAX_SLEEP = int(os.environ.get('TIMER_MAX_SLEEP', 60))
+TIMER_RETRY_DELAY = int(os.environ.get('TIMER_RETRY_DELAY', 60))
+
+log = get_logger('reminder_timer')
+
+
+def next_wake_time():
+    """Earliest time (naive local datetime) at which a tick has something to send, or None"""
+    next_due = get_next_due_time(skip=outbox.parked())
+    retry_at = outbox.next_attempt_time()
+    if retry_at is not None:
+        retry_at = datetime.fromtimestamp(retry_at)
+        next_due = retry_at if next_due is None else min(next_due, retry_at)
+    return next_due
+
+
+class ReminderTimer:
+    def __init__(self, dispatch):
+        # dispatch() returns False when another dispatcher held the lease
+        self.dispatch = dispatch
+        self._cond = threading.Condition()
+        self._wake_at = None
+        self._woken = False
+        self._notified = None  # earliest reminder_time announced since the last dispatch
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        add_reminder_listener(self.notify)
+        self._thread = threading.Thread(target=self._run, name='reminder-timer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def notify(self, reminder_time):
+        """Called when a reminder is added or rescheduled to reminder_time"""
+        with self._cond:
+            if self._notified is None or reminder_time < self._notified:
+                self._notified = reminder_time
+            if self._wake_at is None or reminder_time < self._wake_at:
+                self._woken = True
+                self._cond.notify()
+
+    def _sleep_until(self, wake_at):
+        with self._cond:
+            self._wake_at = wake_at
+            self._woken = False
+            while not self._stopped and not self._woken:
+                remaining = (wake_at - datetime.now()).total_seconds()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self._wake_at = None
+
+    def _run(self):
+        retry_after = None
+        while not self._stopped:
+            now = datetime.now()
+            try:
+                next_due = next_wake_time()
+            except Exception as e:
+                log.error("❌ Reminder timer could not read the next due time: %s", e, exc_info=True)
+                next_due = None
+
+            backing_off = retry_after is not None and now < retry_after
+            notified = self._notified
+            if next_due is not None and next_due <= now and (not backing_off or (notified is not None and notified <= now)):
+                with self._cond:
+                    self._notified = None
+                try:
+                    dispatched = self.dispatch() is not False
+                except Exception as e:
+                    log.error("❌ Reminder timer dispatch failed: %s", e, exc_info=True)
+                    dispatched = False
+                # Failed sends are rescheduled by the outbox; only a lease held elsewhere (or an error) means waiting
+                retry_after = None if dispatched else datetime.now() + timedelta(seconds=TIMER_RETRY_DELAY)
+                continue
+
+            wake_at = now + timedelta(seconds=TIMER_MAX_SLEEP)
+            if backing_off:
+                wake_at = min(wake_at, retry_after)
+                if notified is not None:
+                    wake_at = min(wake_at, notified)
+            elif next_due is not None:
+                wake_at = min(wake_at, next_due)
+            self._sleep_until(wake_at)
@@ -1,27 +1,55 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, Response, stream_with_context
 import csv
 from flask_login import login_required, current_user
 from datetime import datetime
 import io
 import sys
+import zlib
 
 # Add project directory to path for imports when running as script
 sys.path.insert(0, 'py-project')
 
-from api.csv_handler import add_reminder, get_reminders_by_user_id, get_reminder_by_id, update_reminder
+from api import metrics
+from api.records import to_epoch
+from api.csv_handler import add_reminder, get_reminders_by_user_id, get_reminder_by_id, update_reminder, import_reminders_csv, iter_reminders_by_user_id, query_reminders, count_reminders
 
 reminders_bp = Blueprint('reminders', __name__)
 
+DASHBOARD_PAGE_SIZE = 25
+DASHBOARD_MAX_PAGE_SIZE = 100
+
+def _parse_filter_time(value):
+    """Convert a datetime-local form value to epoch seconds like Reminder.reminder_time"""
+    try:
+        return to_epoch(datetime.strptime(value, '%Y-%m-%dT%H:%M')) if value else None
+    except ValueError:
+        return None
+
 @reminders_bp.route('/dashboard')
 @login_required
 def dashboard():
-    # Get user's reminders with error handling
+    status = request.args.get('status') if request.args.get('status') in ('pending', 'completed') else None
+    start_str = request.args.get('from', '')
+    end_str = request.args.get('to', '')
+    cursor = request.args.get('cursor')
+    limit = max(1, min(request.args.get('limit', DASHBOARD_PAGE_SIZE, type=int) or DASHBOARD_PAGE_SIZE, DASHBOARD_MAX_PAGE_SIZE))
+    start = _parse_filter_time(start_str)
+    end = _parse_filter_time(end_str)
+    if end is not None:
+        end += 59  # include the whole minute
+
+    # Get one page of the user's reminders with error handling
     try:
-        reminders = get_reminders_by_user_id(str(current_user.id))
+        reminders, next_cursor = query_reminders(str(current_user.id), status, start, end, cursor, limit)
+        counts = count_reminders(str(current_user.id))
     except Exception as e:
         print(f"Error fetching reminders for user {current_user.id}: {e}")
-        reminders = []
-    return render_template('dashboard.html', reminders=reminders)
+        reminders, next_cursor = [], None
+        counts = {'total': 0, 'pending': 0, 'completed': 0, 'with_email': 0}
+
+    filters = {'status': status or '', 'from': start_str, 'to': end_str, 'limit': limit}
+    return render_template('dashboard.html', reminders=reminders, counts=counts,
+                           filters=filters, cursor=cursor, next_cursor=next_cursor)
 
 @reminders_bp.route('/create_reminder', methods=['GET', 'POST'])
 @login_required
@@ -57,7 +85,7 @@ def edit_reminder(reminder_id):
     reminder = get_reminder_by_id(reminder_id)
     
     # Check if reminder exists and belongs to current user
-    if not reminder or reminder['user_id'] != current_user.id:
+    if not reminder or reminder.user_id != current_user.id:
         flash('You cannot edit this reminder')
         return redirect(url_for('reminders.dashboard'))
     
@@ -75,11 +103,11 @@ def edit_reminder(reminder_id):
             return redirect(url_for('reminders.edit_reminder', reminder_id=reminder_id))
         
         # Update reminder using CSV
-        update_reminder(reminder_id, title, description, reminder_time, recipient_email, attachment)
+        update_reminder(reminder_id, title, description, reminder_time, recipient_email)
         flash('Reminder updated successfully!')
         return redirect(url_for('reminders.dashboard'))
     
-    reminder_time = datetime.strptime(reminder['reminder_time'], '%Y-%m-%d %H:%M:%S')
+    reminder_time = reminder.due_at or datetime.now()
     return render_template('edit_reminder.html', reminder=reminder, reminder_time=reminder_time)
 
 @reminders_bp.route('/delete_reminder/<reminder_id>')
@@ -88,7 +116,7 @@ def delete_reminder(reminder_id):
     reminder = get_reminder_by_id(reminder_id)
     
     # Check if reminder exists and belongs to current user
-    if not reminder or reminder['user_id'] != current_user.id:
+    if not reminder or reminder.user_id != current_user.id:
         flash('You cannot delete this reminder')
         return redirect(url_for('reminders.dashboard'))
     
@@ -98,44 +126,62 @@ def delete_reminder(reminder_id):
     flash('Reminder deleted successfully!')
     return redirect(url_for('reminders.dashboard'))
 
+EXPORT_CHUNK_SIZE = 16 * 1024
+
+def _export_rows(reminders):
+    """Yield CSV-encoded chunks of roughly EXPORT_CHUNK_SIZE bytes"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    # Write header
+    writer.writerow(['id', 'user_id', 'title', 'description', 'reminder_time', 'created_at', 'is_completed', 'recipient_email'])
+
+    # Write data with validation and defaults
+    for reminder in reminders:
+        writer.writerow([
+            reminder.id,
+            reminder.user_id,
+            reminder.title,
+            reminder.description,
+            reminder.reminder_time_text,
+            '',  # created_at is not tracked
+            'Yes' if reminder.is_completed else 'No',
+            reminder.recipient_email
+        ])
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
 @reminders_bp.route('/export_reminders')
 @login_required
 def export_reminders():
     try:
         # Convert current_user.id to string for consistency
         user_id_str = str(current_user.id)
-        # Get user's reminders
-        reminders = get_reminders_by_user_id(user_id_str)
-        
-        # Create CSV data in memory
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow(['id', 'user_id', 'title', 'description', 'reminder_time', 'created_at', 'is_completed', 'recipient_email'])
-        
-        # Write data with validation and defaults
-        for reminder in reminders:
-            writer.writerow([
-                reminder.get('id', ''),
-                reminder.get('user_id', ''),
-                reminder.get('title', ''),
-                reminder.get('description') or '',
-                reminder.get('reminder_time', ''),
-                reminder.get('created_at', ''),
-                'Yes' if str(reminder.get('is_completed', '')).lower() == 'true' else 'No',
-                reminder.get('recipient_email', '') or ''
-            ])
-        
-        # Prepare file for download
-        output.seek(0)
-        
-        return send_file(
-            io.BytesIO(output.getvalue().encode('utf-8')),
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'reminders_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-        )
+        # Stream rows straight from the storage iterator, nothing is buffered whole
+        chunks = _export_rows(iter_reminders_by_user_id(user_id_str))
+
+        headers = {
+            'Content-Disposition': f'attachment; filename=reminders_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+            'Vary': 'Accept-Encoding',
+        }
+        if request.accept_encodings['gzip'] > 0:
+            chunks = _gzip_chunks(chunks)
+            headers['Content-Encoding'] = 'gzip'
+
+        return Response(stream_with_context(chunks), mimetype='text/csv', headers=headers)
     except Exception as e:
         print(f"Error exporting reminders for user {current_user.id}: {e}")
         flash('An error occurred while exporting reminders.')
@@ -159,59 +205,22 @@ def import_reminders():
             return redirect(url_for('reminders.dashboard'))
         
         try:
-            # Read CSV file
-            stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-            csv_reader = csv.DictReader(stream)
-            
-            imported_count = 0
-            skipped_count = 0
-            
-            for row in csv_reader:
-                # Validate required fields
-                if not row.get('title') or not row.get('reminder_time'):
-                    skipped_count += 1
-                    continue
-                
-                # Parse reminder time
-                try:
-                    reminder_time = datetime.strptime(row['reminder_time'], '%Y-%m-%d %H:%M:%S')
-                except ValueError:
-                    skipped_count += 1
-                    continue
-                
-                # Check if reminder already exists (by title and time)
-                existing_reminder = None
-                user_reminders = get_reminders_by_user_id(current_user.id)
-                for user_reminder in user_reminders:
-                    if (user_reminder['title'] == row['title'] and 
-                        user_reminder['reminder_time'] == reminder_time.strftime('%Y-%m-%d %H:%M:%S')):
-                        existing_reminder = user_reminder
-                        break
-                
-                if existing_reminder:
-                    # Update existing reminder
-                    update_reminder(
-                        existing_reminder['id'],
-                        row['title'],
-                        row.get('description', ''),
-                        reminder_time,
-                        row.get('recipient_email', '') or None
-                    )
-                else:
-                    # Create new reminder
-                    add_reminder(
-                        current_user.id,
-                        row['title'],
-                        row.get('description', ''),
-                        reminder_time,
-                        row.get('recipient_email', '') or None
-                    )
-                    imported_count += 1
-            
-            flash(f'Imported {imported_count} reminders, skipped {skipped_count} due to missing fields.')
+            # Stream the upload through the CSV reader instead of decoding it all at once
+            stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+            imported_count, updated_count, errors = import_reminders_csv(str(current_user.id), stream)
+            metrics.inc('import_rows_total', imported_count, result='imported')
+            metrics.inc('import_rows_total', updated_count, result='updated')
+            metrics.inc('import_rows_total', len(errors), result='invalid')
+
+            flash(f'Imported {imported_count} reminders, updated {updated_count}, skipped {len(errors)} invalid rows.')
+            for line_number, message in errors[:5]:
+                flash(f'Row {line_number}: {message}')
+            if len(errors) > 5:
+                flash(f'... and {len(errors) - 5} more invalid rows.')
             return redirect(url_for('reminders.dashboard'))
         
         except Exception as e:
+            print(f"Error importing reminders for user {current_user.id}: {e}")
             flash('An error occurred while importing reminders.')
             return redirect(url_for('reminders.dashboard'))
     
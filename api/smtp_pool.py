@@ -0,0 +1,141 @@
+import os
+import smtplib
+import threading
+import time
+
+from api import metrics
+
+# Pool of authenticated SMTP connections, one per sender account.
+#
+# Opening an SMTP_SSL connection costs a TLS handshake plus a LOGIN, and doing
+# that for every message also trips provider rate limits. The pool keeps one
+# logged-in connection per sender and reuses it for consecutive messages.
+# A connection is dropped after SMTP_IDLE_TIMEOUT seconds without use or after
+# SMTP_MAX_MESSAGES_PER_CONNECTION messages, and re-established transparently
+# when the server disconnects us.
+#
+# The endpoint defaults to Gmail (implicit TLS on 465) and can be pointed
+# elsewhere per environment: SMTP_SECURITY is ssl, starttls (port 587 style)
+# or none, e.g. for the local sink in api/smtp_sink.py.
+
+SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 465))
+SMTP_SECURITY = os.environ.get('SMTP_SECURITY', 'ssl').lower()
+SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', 60))
+SMTP_IDLE_TIMEOUT = int(os.environ.get('SMTP_IDLE_TIMEOUT', 60))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.environ.get('SMTP_MAX_MESSAGES_PER_CONNECTION', 50))
+
+
+def open_smtp(sender_email, app_password, host=SMTP_HOST, port=SMTP_PORT, security=SMTP_SECURITY):
+    """Connect to the configured SMTP endpoint and log in"""
+    with metrics.timer('smtp_operation_seconds', operation='connect'):
+        if security == 'ssl':
+            server = smtplib.SMTP_SSL(host, port, timeout=SMTP_TIMEOUT)
+        else:
+            server = smtplib.SMTP(host, port, timeout=SMTP_TIMEOUT)
+    try:
+        if security == 'starttls':
+            with metrics.timer('smtp_operation_seconds', operation='starttls'):
+                server.starttls()
+        with metrics.timer('smtp_operation_seconds', operation='login'):
+            server.login(sender_email, app_password)
+    except Exception:
+        _close(server)
+        raise
+    return server
+
+
+class _PooledConnection:
+    def __init__(self, server):
+        self.server = server
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+
+class SMTPConnectionPool:
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, security=SMTP_SECURITY, idle_timeout=SMTP_IDLE_TIMEOUT,
+                 max_messages=SMTP_MAX_MESSAGES_PER_CONNECTION):
+        self.host = host
+        self.port = port
+        self.security = security
+        self.idle_timeout = idle_timeout
+        self.max_messages = max_messages
+        self._connections = {}
+        self._sender_locks = {}
+        self._lock = threading.Lock()
+
+    def _sender_lock(self, key):
+        with self._lock:
+            return self._sender_locks.setdefault(key, threading.Lock())
+
+    def _connect(self, sender_email, app_password):
+        return _PooledConnection(open_smtp(sender_email, app_password, self.host, self.port, self.security))
+
+    def _checkout(self, key, sender_email, app_password):
+        conn = self._connections.get(key)
+        if conn is not None and (conn.sent >= self.max_messages
+                                 or time.monotonic() - conn.last_used > self.idle_timeout):
+            _close(conn.server)
+            conn = None
+        if conn is None:
+            conn = self._connect(sender_email, app_password)
+            self._connections[key] = conn
+        return conn
+
+    def sendmail(self, sender_email, app_password, receiver_email, message):
+        """Send message (str or bytes) over the sender's pooled connection"""
+        key = (sender_email, app_password)
+        with self._sender_lock(key):
+            conn = self._checkout(key, sender_email, app_password)
+            try:
+                with metrics.timer('smtp_operation_seconds', operation='send'):
+                    conn.server.sendmail(sender_email, receiver_email, message)
+            except smtplib.SMTPServerDisconnected:
+                # Server closed an idle or overused connection; reconnect once and retry
+                self._connections.pop(key, None)
+                _close(conn.server)
+                conn = self._checkout(key, sender_email, app_password)
+                conn.server.sendmail(sender_email, receiver_email, message)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError):
+                # The message was rejected but the session is still usable
+                conn.last_used = time.monotonic()
+                raise
+            except Exception:
+                self._connections.pop(key, None)
+                _close(conn.server)
+                raise
+            conn.sent += 1
+            conn.last_used = time.monotonic()
+
+    def close_idle(self):
+        """Close connections that have been idle longer than idle_timeout"""
+        now = time.monotonic()
+        for key, conn in list(self._connections.items()):
+            lock = self._sender_lock(key)
+            if now - conn.last_used > self.idle_timeout and lock.acquire(blocking=False):
+                try:
+                    if self._connections.get(key) is conn:
+                        del self._connections[key]
+                        _close(conn.server)
+                finally:
+                    lock.release()
+
+    def close_all(self):
+        for key, conn in list(self._connections.items()):
+            with self._sender_lock(key):
+                if self._connections.get(key) is conn:
+                    del self._connections[key]
+                    _close(conn.server)
+
+
+def _close(server):
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+
+smtp_pool = SMTPConnectionPool()
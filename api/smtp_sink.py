@@ -0,0 +1,186 @@
+import argparse
+import asyncio
+import base64
+import random
+import threading
+import time
+
+# In-process asyncio SMTP sink for offline delivery testing.
+#
+# Speaks just enough SMTP for smtplib and aiosmtplib (EHLO, AUTH PLAIN/LOGIN,
+# MAIL, RCPT, DATA, RSET, QUIT), accepts any credentials and never relays
+# anything. Faults can be injected per message: a fixed latency before the
+# DATA reply, a 451 temporary rejection with probability error_rate, or a
+# dropped connection (no reply) with probability disconnect_rate.
+#
+# Point the app at it with SMTP_HOST=127.0.0.1 SMTP_PORT=<port>
+# SMTP_SECURITY=none, or run it standalone:
+#
+#   python -m api.smtp_sink --port 2525 --latency 0.05 --error-rate 0.01
+
+
+class SMTPSink:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, disconnect_rate=0.0,
+                 seed=None, on_message=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.disconnect_rate = disconnect_rate
+        # on_message(received_at, mail_from, rcpt_tos, data) runs on the sink's event loop
+        self.on_message = on_message
+        self.received = 0
+        self.rejected = 0
+        self.disconnected = 0
+        self.connections = 0
+        self._random = random.Random(seed)
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._sessions = set()
+
+    async def _reply(self, writer, line):
+        writer.write(line + b'\r\n')
+        await writer.drain()
+
+    async def _auth(self, reader, writer, args):
+        mechanism = args.split(b' ', 1)[0].upper() if args else b''
+        if mechanism == b'LOGIN':
+            # Username and password prompts unless sent as an initial response
+            prompts = [b'334 ' + base64.b64encode(b'Password:')]
+            if len(args.split()) < 2:
+                prompts.insert(0, b'334 ' + base64.b64encode(b'Username:'))
+            for prompt in prompts:
+                await self._reply(writer, prompt)
+                await reader.readline()
+        elif mechanism == b'PLAIN' and len(args.split()) < 2:
+            await self._reply(writer, b'334 ')
+            await reader.readline()
+        await self._reply(writer, b'235 2.7.0 Authentication successful')
+
+    async def _finish_message(self, writer, mail_from, rcpt_tos, data):
+        """Reply to the end of DATA; returns False when the connection was dropped"""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.disconnect_rate and self._random.random() < self.disconnect_rate:
+            self.disconnected += 1
+            writer.close()
+            return False
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.rejected += 1
+            await self._reply(writer, b'451 4.3.0 Injected temporary failure')
+            return True
+        self.received += 1
+        if self.on_message is not None:
+            self.on_message(time.time(), mail_from, rcpt_tos, bytes(data))
+        await self._reply(writer, b'250 2.0.0 Queued')
+        return True
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._sessions.add(asyncio.current_task())
+        mail_from, rcpt_tos = None, []
+        try:
+            await self._reply(writer, b'220 localhost SMTP sink ready')
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command, _, args = line.rstrip(b'\r\n').partition(b' ')
+                command = command.upper()
+                if command in (b'EHLO', b'HELO'):
+                    await self._reply(writer, b'250-localhost\r\n250-8BITMIME\r\n250 AUTH PLAIN LOGIN')
+                elif command == b'AUTH':
+                    await self._auth(reader, writer, args)
+                elif command == b'MAIL':
+                    mail_from, rcpt_tos = args, []
+                    await self._reply(writer, b'250 2.1.0 OK')
+                elif command == b'RCPT':
+                    rcpt_tos.append(args)
+                    await self._reply(writer, b'250 2.1.5 OK')
+                elif command == b'DATA':
+                    await self._reply(writer, b'354 End data with <CR><LF>.<CR><LF>')
+                    data = bytearray()
+                    while True:
+                        line = await reader.readline()
+                        if not line or line == b'.\r\n':
+                            break
+                        data += line[1:] if line.startswith(b'..') else line
+                    if not line or not await self._finish_message(writer, mail_from, rcpt_tos, data):
+                        return
+                    mail_from, rcpt_tos = None, []
+                elif command == b'RSET':
+                    mail_from, rcpt_tos = None, []
+                    await self._reply(writer, b'250 2.0.0 OK')
+                elif command == b'QUIT':
+                    await self._reply(writer, b'221 2.0.0 Bye')
+                    break
+                else:
+                    await self._reply(writer, b'250 OK')
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._sessions.discard(asyncio.current_task())
+            writer.close()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._shutdown())
+        self._loop.close()
+
+    async def _shutdown(self):
+        """Stop accepting and drop the sessions clients left open"""
+        self._server.close()
+        sessions = list(self._sessions)
+        for session in sessions:
+            session.cancel()
+        await asyncio.gather(*sessions, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def start(self):
+        """Serve from a daemon thread; returns once the port is bound"""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name='smtp-sink', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+
+    def stats(self):
+        return {'received': self.received, 'rejected': self.rejected,
+                'disconnected': self.disconnected, 'connections': self.connections}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local SMTP sink with optional fault injection')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2525)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each DATA reply')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of messages rejected with 451')
+    parser.add_argument('--disconnect-rate', type=float, default=0.0, help='share of messages answered by hanging up')
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.host, args.port, args.latency, args.error_rate, args.disconnect_rate,
+                    on_message=lambda received_at, mail_from, rcpt_tos, data: print(
+                        f"📧 {mail_from.decode(errors='replace')} -> {b', '.join(rcpt_tos).decode(errors='replace')} ({len(data)} bytes)"))
+    sink.start()
+    print(f"✅ SMTP sink listening on {sink.host}:{sink.port} (SMTP_SECURITY=none)")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"📋 {sink.stats()}")
+    except KeyboardInterrupt:
+        sink.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+import os
+import sqlite3
+import threading
+
+from api.reminder_log import ReminderLog
+from api.table_cache import TableCache
+from api.reminder_query import empty_counts
+from api.records import User, Reminder, USER_FIELDS, REMINDER_FIELDS, to_epoch, from_epoch, format_epoch
+
+# Storage backends for users and reminders.
+# The CSV backend is the original flat-file layout; the SQLite backend keeps the
+# same string-valued rows but adds primary keys and indexes so point lookups and
+# per-user listings do not have to scan the whole table. Both return User and
+# Reminder records (api/records.py) and take writes as dicts of stored values.
+
+DATA_DIR = os.environ.get('DATA_DIR') or os.path.join(os.path.dirname(__file__), '..', 'data')
+USERS_CSV = os.path.join(DATA_DIR, 'users.csv')
+REMINDERS_CSV = os.path.join(DATA_DIR, 'reminders.csv')
+SQLITE_DB = os.environ.get('SQLITE_DB') or os.path.join(DATA_DIR, 'reminders.db')
+
+
+class Storage:
+    """Interface shared by all storage backends.
+
+    Reads return User/Reminder records; writes take dicts of field values.
+    Reminder time bounds and cursors are epoch seconds (see api/records.py).
+    """
+
+    # Users
+    def get_all_users(self):
+        raise NotImplementedError
+
+    def get_user_by_id(self, user_id):
+        raise NotImplementedError
+
+    def get_users_by_ids(self, user_ids):
+        """{user_id: user} for the given ids, missing users are left out"""
+        users = {}
+        for user_id in user_ids:
+            user = self.get_user_by_id(user_id)
+            if user:
+                users[user_id] = user
+        return users
+
+    def get_user_by_email(self, email):
+        raise NotImplementedError
+
+    def get_user_by_reset_token(self, token):
+        raise NotImplementedError
+
+    def insert_user(self, user):
+        raise NotImplementedError
+
+    def update_user(self, user_id, **fields):
+        raise NotImplementedError
+
+    # Reminders
+    def get_all_reminders(self):
+        raise NotImplementedError
+
+    def get_reminder_by_id(self, reminder_id):
+        raise NotImplementedError
+
+    def get_reminders_by_user_id(self, user_id):
+        raise NotImplementedError
+
+    def iter_reminders_by_user_id(self, user_id):
+        """Iterate a user's reminders without materialising copies of all of them"""
+        return iter(self.get_reminders_by_user_id(user_id))
+
+    def query_reminders(self, user_id, status=None, start=None, end=None, after=None, limit=25):
+        """One page of a user's reminders in (reminder_time, id) order.
+
+        status is 'pending', 'completed' or None; start/end are inclusive
+        reminder_time bounds; after is a (reminder_time, id) cursor.
+        """
+        raise NotImplementedError
+
+    def count_reminders(self, user_id):
+        """Maintained counters: total, pending, completed and with_email"""
+        raise NotImplementedError
+
+    def get_due_reminders(self, now):
+        """Pending reminders with reminder_time <= now, earliest first"""
+        raise NotImplementedError
+
+    def get_due_reminders_by_user(self, now):
+        """Due reminders grouped as {user_id: [reminders, earliest first]}"""
+        groups = {}
+        for reminder in self.get_due_reminders(now):
+            groups.setdefault(reminder.user_id, []).append(reminder)
+        return groups
+
+    def get_next_due_time(self, skip=None):
+        """Earliest reminder_time (datetime) among pending reminders, or None.
+
+        skip ({reminder id: epoch reminder_time}) leaves out reminders that are
+        handled elsewhere, unless they were rescheduled since.
+        """
+        raise NotImplementedError
+
+    def insert_reminder(self, reminder):
+        raise NotImplementedError
+
+    def update_reminder(self, reminder_id, **fields):
+        raise NotImplementedError
+
+    def apply_reminder_changes(self, inserts, updates):
+        """Insert new rows and apply [(reminder_id, fields), ...] in one write.
+
+        Returns (inserted, updated); updates for unknown ids are ignored.
+        """
+        raise NotImplementedError
+
+    def update_reminders(self, changes):
+        return self.apply_reminder_changes([], changes)[1]
+
+    def delete_reminder(self, reminder_id):
+        raise NotImplementedError
+
+
+def _stringify(row, fieldnames):
+    return {name: '' if row.get(name) is None else str(row.get(name)) for name in fieldnames}
+
+
+class CSVStorage(Storage):
+    """Flat-file backend. Tables are cached in memory; reminders use an append-only log."""
+
+    def __init__(self, users_csv=USERS_CSV, reminders_csv=REMINDERS_CSV):
+        self.users_csv = users_csv
+        self.reminders_csv = reminders_csv
+        self.users = TableCache(users_csv, User, USER_FIELDS, indexes=('email',))
+        self.reminder_log = ReminderLog(reminders_csv, REMINDER_FIELDS)
+
+    # Users are served from an in-process cache (see api/table_cache.py)
+    def get_all_users(self):
+        return self.users.rows()
+
+    def get_user_by_id(self, user_id):
+        return self.users.get(user_id)
+
+    def get_users_by_ids(self, user_ids):
+        return self.users.get_many(user_ids)
+
+    def get_user_by_email(self, email):
+        return self.users.lookup('email', email)
+
+    def get_user_by_reset_token(self, token):
+        for user in self.users.rows():
+            if user.reset_token == token:
+                return user
+        return None
+
+    def insert_user(self, user):
+        self.users.insert(user)
+
+    def update_user(self, user_id, **fields):
+        return self.users.update(user_id, fields)
+
+    # Reminders are served from the snapshot + append-only log (see api/reminder_log.py).
+    # The cached records are immutable and returned without copying.
+    def get_all_reminders(self):
+        return list(self.reminder_log.rows().values())
+
+    def get_reminder_by_id(self, reminder_id):
+        return self.reminder_log.get(reminder_id)
+
+    def get_reminders_by_user_id(self, user_id):
+        return self.reminder_log.rows_for_user(user_id)
+
+    def iter_reminders_by_user_id(self, user_id):
+        return iter(self.reminder_log.rows_for_user(user_id))
+
+    def query_reminders(self, user_id, status=None, start=None, end=None, after=None, limit=25):
+        return self.reminder_log.query_user(user_id, status, start, end, after, limit)
+
+    def count_reminders(self, user_id):
+        return self.reminder_log.counts_for_user(user_id)
+
+    def get_due_reminders(self, now):
+        return self.reminder_log.due_rows(now)
+
+    def get_due_reminders_by_user(self, now):
+        return self.reminder_log.due_rows_by_user(now)
+
+    def get_next_due_time(self, skip=None):
+        return self.reminder_log.next_due_time(skip)
+
+    def insert_reminder(self, reminder):
+        self.reminder_log.insert(_stringify(reminder, REMINDER_FIELDS))
+
+    def update_reminder(self, reminder_id, **fields):
+        return self.reminder_log.update(reminder_id, _stringify(fields, fields))
+
+    def apply_reminder_changes(self, inserts, updates):
+        return self.reminder_log.apply_changes(
+            [_stringify(reminder, REMINDER_FIELDS) for reminder in inserts],
+            [(reminder_id, _stringify(fields, fields)) for reminder_id, fields in updates])
+
+    def delete_reminder(self, reminder_id):
+        return self.reminder_log.delete(reminder_id)
+
+
+SQLITE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    {', '.join(f"{name} TEXT NOT NULL DEFAULT ''" for name in USER_FIELDS[1:])}
+);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+CREATE TABLE IF NOT EXISTS reminders (
+    id TEXT PRIMARY KEY,
+    {', '.join(f"{name} TEXT NOT NULL DEFAULT ''" for name in REMINDER_FIELDS[1:])}
+);
+CREATE INDEX IF NOT EXISTS idx_reminders_user_id ON reminders(user_id);
+CREATE INDEX IF NOT EXISTS idx_reminders_due ON reminders(is_completed, reminder_time);
+CREATE INDEX IF NOT EXISTS idx_reminders_user_time ON reminders(user_id, reminder_time, id);
+
+-- Per-user counters for the dashboard, maintained by triggers
+CREATE TABLE IF NOT EXISTS reminder_counts (
+    user_id TEXT PRIMARY KEY,
+    total INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    with_email INTEGER NOT NULL DEFAULT 0
+);
+CREATE TRIGGER IF NOT EXISTS reminders_count_insert AFTER INSERT ON reminders BEGIN
+    INSERT OR IGNORE INTO reminder_counts (user_id) VALUES (NEW.user_id);
+    UPDATE reminder_counts SET total = total + 1, completed = completed + (NEW.is_completed = 'True'),
+        with_email = with_email + (NEW.recipient_email != '') WHERE user_id = NEW.user_id;
+END;
+CREATE TRIGGER IF NOT EXISTS reminders_count_delete AFTER DELETE ON reminders BEGIN
+    UPDATE reminder_counts SET total = total - 1, completed = completed - (OLD.is_completed = 'True'),
+        with_email = with_email - (OLD.recipient_email != '') WHERE user_id = OLD.user_id;
+END;
+CREATE TRIGGER IF NOT EXISTS reminders_count_update AFTER UPDATE ON reminders BEGIN
+    UPDATE reminder_counts SET total = total - 1, completed = completed - (OLD.is_completed = 'True'),
+        with_email = with_email - (OLD.recipient_email != '') WHERE user_id = OLD.user_id;
+    INSERT OR IGNORE INTO reminder_counts (user_id) VALUES (NEW.user_id);
+    UPDATE reminder_counts SET total = total + 1, completed = completed + (NEW.is_completed = 'True'),
+        with_email = with_email + (NEW.recipient_email != '') WHERE user_id = NEW.user_id;
+END;
+"""
+
+
+def _upsert_sql(table, fieldnames):
+    # An upsert rather than INSERT OR REPLACE: REPLACE would also override the
+    # conflict policy of the statements inside the reminder_counts triggers
+    return (f"INSERT INTO {table} ({', '.join(fieldnames)}) VALUES ({', '.join('?' for _ in fieldnames)}) "
+            f"ON CONFLICT(id) DO UPDATE SET {', '.join(f'{name} = excluded.{name}' for name in fieldnames[1:])}")
+
+
+class SQLiteStorage(Storage):
+    """Indexed backend: O(log n) lookups by id, email and user_id."""
+
+    def __init__(self, db_path=SQLITE_DB, migrate_from_csv=True):
+        self.db_path = db_path
+        self._local = threading.local()
+        is_new = not os.path.exists(db_path)
+        conn = self._conn()
+        has_counts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'reminder_counts'").fetchone()
+        conn.executescript(SQLITE_SCHEMA)
+        if not has_counts:
+            # Databases created before the counters existed
+            with conn:
+                conn.execute("""INSERT INTO reminder_counts (user_id, total, completed, with_email)
+                                SELECT user_id, COUNT(*), SUM(is_completed = 'True'), SUM(recipient_email != '')
+                                FROM reminders GROUP BY user_id""")
+        if is_new and migrate_from_csv:
+            migrate_csv_to_sqlite(CSVStorage(), self)
+
+    def _conn(self):
+        # sqlite3 connections cannot be shared across threads, keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _one(self, sql, params, record=None):
+        row = self._conn().execute(sql, params).fetchone()
+        if not row:
+            return None
+        return record.from_row(dict(row)) if record else dict(row)
+
+    def _all(self, sql, params=(), record=None):
+        rows = self._conn().execute(sql, params)
+        if record:
+            return [record.from_row(dict(row)) for row in rows]
+        return [dict(row) for row in rows]
+
+    def _insert(self, table, fieldnames, row):
+        row = _stringify(row, fieldnames)
+        with self._conn() as conn:
+            conn.execute(_upsert_sql(table, fieldnames),
+                         [row[name] for name in fieldnames])
+
+    def _update(self, table, row_id, fields):
+        if not fields:
+            return self._one(f"SELECT id FROM {table} WHERE id = ?", (row_id,)) is not None
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        values = ['' if value is None else str(value) for value in fields.values()]
+        with self._conn() as conn:
+            cursor = conn.execute(f"UPDATE {table} SET {assignments} WHERE id = ?", values + [row_id])
+        return cursor.rowcount > 0
+
+    # Users
+    def get_all_users(self):
+        return self._all("SELECT * FROM users", record=User)
+
+    def get_user_by_id(self, user_id):
+        return self._one("SELECT * FROM users WHERE id = ?", (user_id,), User)
+
+    def get_users_by_ids(self, user_ids):
+        user_ids = list(user_ids)
+        users = {}
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(user_ids), 500):
+            chunk = user_ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for user in self._all(f"SELECT * FROM users WHERE id IN ({placeholders})", chunk, User):
+                users[user.id] = user
+        return users
+
+    def get_user_by_email(self, email):
+        return self._one("SELECT * FROM users WHERE email = ?", (email,), User)
+
+    def get_user_by_reset_token(self, token):
+        return self._one("SELECT * FROM users WHERE reset_token = ?", (token,), User)
+
+    def insert_user(self, user):
+        self._insert('users', USER_FIELDS, user)
+
+    def update_user(self, user_id, **fields):
+        return self._update('users', user_id, fields)
+
+    # Reminders
+    def get_all_reminders(self):
+        return self._all("SELECT * FROM reminders", record=Reminder)
+
+    def get_reminder_by_id(self, reminder_id):
+        return self._one("SELECT * FROM reminders WHERE id = ?", (reminder_id,), Reminder)
+
+    def get_reminders_by_user_id(self, user_id):
+        return self._all("SELECT * FROM reminders WHERE user_id = ?", (user_id,), Reminder)
+
+    def iter_reminders_by_user_id(self, user_id):
+        # Use a dedicated cursor so the generator can be consumed lazily
+        cursor = self._conn().execute("SELECT * FROM reminders WHERE user_id = ?", (user_id,))
+        for row in cursor:
+            yield Reminder.from_row(dict(row))
+
+    def query_reminders(self, user_id, status=None, start=None, end=None, after=None, limit=25):
+        # Served by idx_reminders_user_time
+        clauses = ["user_id = ?"]
+        params = [user_id]
+        if status == 'completed':
+            clauses.append("is_completed = 'True'")
+        elif status == 'pending':
+            clauses.append("is_completed != 'True'")
+        # Stored times are 'YYYY-MM-DD HH:MM:SS' text, which sorts like the epoch values
+        if start is not None:
+            clauses.append("reminder_time >= ?")
+            params.append(format_epoch(start))
+        if end is not None:
+            clauses.append("reminder_time <= ?")
+            params.append(format_epoch(end))
+        if after:
+            clauses.append("(reminder_time, id) > (?, ?)")
+            params.extend((format_epoch(after[0]) if after[0] else '', after[1]))
+        params.append(limit)
+        return self._all(f"SELECT * FROM reminders WHERE {' AND '.join(clauses)} ORDER BY reminder_time, id LIMIT ?",
+                         params, Reminder)
+
+    def count_reminders(self, user_id):
+        counts = self._one("SELECT total, completed, with_email FROM reminder_counts WHERE user_id = ?", (user_id,))
+        if not counts:
+            return empty_counts()
+        counts['pending'] = counts['total'] - counts['completed']
+        return counts
+
+    def get_due_reminders(self, now):
+        # Served by idx_reminders_due
+        return self._all("SELECT * FROM reminders WHERE is_completed = 'False' AND reminder_time <= ? ORDER BY reminder_time",
+                         (now.strftime('%Y-%m-%d %H:%M:%S'),), Reminder)
+
+    def get_next_due_time(self, skip=None):
+        # Walks idx_reminders_due in order, skipping rows whose time does not parse
+        skip = skip or {}
+        for row in self._conn().execute("SELECT id, reminder_time FROM reminders WHERE is_completed = 'False' ORDER BY reminder_time"):
+            due = to_epoch(row['reminder_time'])
+            if due is not None and skip.get(row['id']) != due:
+                return from_epoch(due)
+        return None
+
+    def insert_reminder(self, reminder):
+        self._insert('reminders', REMINDER_FIELDS, reminder)
+
+    def update_reminder(self, reminder_id, **fields):
+        return self._update('reminders', reminder_id, fields)
+
+    def apply_reminder_changes(self, inserts, updates):
+        inserts = [_stringify(reminder, REMINDER_FIELDS) for reminder in inserts]
+        updated = 0
+        with self._conn() as conn:
+            conn.executemany(
+                _upsert_sql('reminders', REMINDER_FIELDS),
+                [[reminder[name] for name in REMINDER_FIELDS] for reminder in inserts])
+            for reminder_id, fields in updates:
+                if not fields:
+                    continue
+                assignments = ', '.join(f"{name} = ?" for name in fields)
+                values = ['' if value is None else str(value) for value in fields.values()]
+                updated += conn.execute(f"UPDATE reminders SET {assignments} WHERE id = ?", values + [reminder_id]).rowcount
+        return len(inserts), updated
+
+    def delete_reminder(self, reminder_id):
+        with self._conn() as conn:
+            cursor = conn.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
+        return cursor.rowcount > 0
+
+
+def migrate_csv_to_sqlite(source, target):
+    """Copy every user and reminder from a CSVStorage into a SQLiteStorage"""
+    users = [user.to_row() for user in source.get_all_users()]
+    reminders = [reminder.to_row() for reminder in source.get_all_reminders()]
+    with target._conn() as conn:
+        conn.executemany(
+            _upsert_sql('users', USER_FIELDS),
+            [[user[name] for name in USER_FIELDS] for user in users])
+        conn.executemany(
+            _upsert_sql('reminders', REMINDER_FIELDS),
+            [[reminder[name] for name in REMINDER_FIELDS] for reminder in reminders])
+    return len(users), len(reminders)
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Return the process-wide storage backend selected by STORAGE_BACKEND (csv or sqlite)"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                backend = os.environ.get('STORAGE_BACKEND', 'csv').lower()
+                if backend == 'sqlite':
+                    _storage = SQLiteStorage()
+                else:
+                    _storage = CSVStorage()
+    return _storage
+
+
+def set_storage(storage):
+    """Replace the process-wide storage backend (used by scripts and migrations)"""
+    global _storage
+    _storage = storage
@@ -0,0 +1,133 @@
+import csv
+import os
+import threading
+
+from api import metrics
+from api.locking import FileRWLock, VersionConflict, atomic_write
+
+# In-process cache of a parsed CSV table.
+#
+# The file is parsed once into records (see api/records.py) and kept in memory
+# together with dict indexes; it is
+# only re-parsed when its (inode, mtime, size) signature changes, i.e. when some
+# other process rewrote it. Writes made through the cache update the in-memory
+# copy directly, so steady-state lookups never touch the CSV parser.
+# Writes are optimistic read-modify-write cycles committed atomically under a
+# cross-process lock (see api/locking.py).
+
+WRITE_RETRIES = 5
+
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class TableCache:
+    def __init__(self, path, record, fieldnames, key='id', indexes=()):
+        self.path = path
+        self.record = record  # record class with from_row/to_row/with_fields
+        self.fieldnames = fieldnames
+        self.key = key
+        self.index_fields = indexes
+        self._lock = threading.RLock()
+        self.file_lock = FileRWLock(path + '.lock')
+        self._signature = False  # never matches, forces the first load
+        self._rows = {}
+        self._indexes = {}
+
+    def _build(self, rows):
+        self._rows = {getattr(row, self.key): row for row in rows}
+        self._indexes = {field: {} for field in self.index_fields}
+        for row in rows:
+            for field, index in self._indexes.items():
+                # Keep the first row for duplicate values, as a linear scan would
+                index.setdefault(getattr(row, field), row)
+
+    def _refresh(self):
+        if file_signature(self.path) == self._signature:
+            return
+        with self.file_lock.read():
+            signature = file_signature(self.path)
+            rows = []
+            if signature is not None:
+                with open(self.path, mode='r', newline='', encoding='utf-8') as f:
+                    rows = [self.record.from_row(row) for row in csv.DictReader(f)]
+                    metrics.inc('file_read_bytes_total', os.fstat(f.fileno()).st_size, file=os.path.basename(self.path))
+        self._build(rows)
+        self._signature = signature
+
+    # Records are immutable, so the cached instances are handed out as they are
+
+    def rows(self):
+        with self._lock:
+            self._refresh()
+            return list(self._rows.values())
+
+    def get(self, key_value):
+        with self._lock:
+            self._refresh()
+            return self._rows.get(key_value)
+
+    def get_many(self, key_values):
+        """{key: row} for the keys that exist, with a single freshness check"""
+        with self._lock:
+            self._refresh()
+            return {key: self._rows[key] for key in key_values if key in self._rows}
+
+    def lookup(self, field, value):
+        with self._lock:
+            self._refresh()
+            return self._indexes[field].get(value)
+
+    def _write(self, rows):
+        def write_rows(f):
+            writer = csv.DictWriter(f, fieldnames=self.fieldnames)
+            writer.writeheader()
+            writer.writerows(row.to_row() for row in rows)
+        atomic_write(self.path, write_rows)
+        self._build(rows)
+        self._signature = file_signature(self.path)
+
+    def _commit(self, mutate):
+        """Optimistic read-modify-write.
+
+        mutate(rows) runs under the shared lock against the current table and
+        returns the new list of rows (or None for no change). The result is
+        only written if the file is still at the version it was computed from;
+        otherwise the table is re-read and mutate runs again.
+        """
+        with self._lock:
+            for _ in range(WRITE_RETRIES):
+                with self.file_lock.read():
+                    self._refresh()
+                    version = self._signature
+                    rows = mutate(list(self._rows.values()))
+                if rows is None:
+                    return False
+                with self.file_lock.write():
+                    if file_signature(self.path) != version:
+                        continue
+                    self._write(rows)
+                    return True
+            raise VersionConflict(f"{self.path} kept changing during {WRITE_RETRIES} write attempts")
+
+    def write(self, rows):
+        """Replace the table on disk and in memory"""
+        with self._lock, self.file_lock.write():
+            self._write(rows)
+
+    def insert(self, row):
+        """Insert a row given as a dict of stored (string) values"""
+        record = self.record.from_row(row)
+        return self._commit(lambda rows: rows + [record])
+
+    def update(self, key_value, fields):
+        def apply(rows):
+            if not any(getattr(row, self.key) == key_value for row in rows):
+                return None
+            return [row.with_fields(fields) if getattr(row, self.key) == key_value else row for row in rows]
+        return self._commit(apply)
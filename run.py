@@ -9,8 +9,8 @@ load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '.env'))
 # Add current directory to path
 sys.path.insert(0, os.path.dirname(__file__))
 
-from api.index import create_app
+# Importing api.index creates the app (and its scheduler) once
+from api.index import app
 
 if __name__ == '__main__':
-    app = create_app()
     app.run(debug=True, host='0.0.0.0', port=5000)
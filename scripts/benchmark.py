@@ -0,0 +1,293 @@
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# Benchmark harness for the storage and dispatch hot paths.
+#
+# Every (backend, table size) runs in its own child process against a fresh
+# temporary DATA_DIR filled with synthetic users and reminders, so caches and
+# peak RSS are measured per size. The child times add_reminder,
+# get_reminders_by_user_id, update_reminder, CSV import and export, the
+# dashboard render and one full dispatcher tick (check_and_send_reminders)
+# against the in-process SMTP sink (api/smtp_sink.py), and reports throughput, p50/p99
+# latency and peak RSS as one JSON record. Records are appended to --output
+# as JSON lines tagged with the git commit, so runs can be compared across
+# commits with --compare.
+#
+#   python scripts/benchmark.py --rows 10000 100000 --backend csv sqlite --output bench.jsonl
+#   python scripts/benchmark.py --rows 10000 --compare bench.jsonl
+
+PASSWORD = 'benchmark'
+
+
+# Synthetic data
+
+def generate_data(data_dir, rows, users, due, senders, seed=0):
+    """Write users.csv and reminders.csv; returns (user ids, reminder ids)"""
+    from werkzeug.security import generate_password_hash
+    from api.records import USER_FIELDS, REMINDER_FIELDS, TIME_FORMAT
+
+    rng = random.Random(seed)
+    password_hash = generate_password_hash(PASSWORD)
+    user_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(users)]
+    with open(os.path.join(data_dir, 'users.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(USER_FIELDS)
+        for i, user_id in enumerate(user_ids):
+            writer.writerow([user_id, f'user{i}@bench.local', password_hash, 'True', '', '', '', '', '',
+                             f'sender{i % senders}@bench.local', 'app-password'])
+
+    now = datetime.now().replace(microsecond=0)
+    reminder_ids = []
+    with open(os.path.join(data_dir, 'reminders.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(REMINDER_FIELDS)
+        for i in range(rows):
+            reminder_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            reminder_ids.append(reminder_id)
+            if i < due:
+                when, completed = now - timedelta(seconds=rng.randint(60, 86400)), False
+            else:
+                when, completed = now + timedelta(seconds=rng.randint(3600, 365 * 86400)), rng.random() < 0.2
+            writer.writerow([reminder_id, user_ids[i % users], f'Reminder {i}', f'Synthetic reminder number {i}',
+                             when.strftime(TIME_FORMAT), '', str(completed)])
+    return user_ids, reminder_ids
+
+
+def import_csv_text(rows, tag):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['title', 'description', 'reminder_time', 'recipient_email'])
+    start = datetime(2100, 1, 1)
+    for i in range(rows):
+        writer.writerow([f'Imported {tag}-{i}', 'bulk import', (start + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S'), ''])
+    return buffer.getvalue()
+
+
+# Measurement
+
+def summarize(samples, items=None):
+    """Latency percentiles (ms) and throughput (items per second) for a list of durations"""
+    ordered = sorted(samples)
+    total = sum(ordered)
+    items = len(ordered) if items is None else items
+
+    def percentile(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+
+    return {
+        'count': len(ordered),
+        'items': items,
+        'total_s': round(total, 6),
+        'throughput_per_s': round(items / total, 2) if total else None,
+        'p50_ms': round(percentile(0.50), 3),
+        'p99_ms': round(percentile(0.99), 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def timed(fn, samples):
+    durations = []
+    for i in range(samples):
+        start = time.perf_counter()
+        fn(i)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_child(args):
+    """Run every benchmark once against a fresh DATA_DIR (env is prepared by the parent)"""
+    data_dir = os.environ['DATA_DIR']
+    users = max(1, args.rows // args.reminders_per_user)
+    due = min(args.due, args.rows)
+    start = time.perf_counter()
+    user_ids, reminder_ids = generate_data(data_dir, args.rows, users, due, args.senders, args.seed)
+    setup_s = time.perf_counter() - start
+
+    from api.smtp_sink import SMTPSink
+    sink = SMTPSink().start()
+    os.environ.update(SMTP_HOST=sink.host, SMTP_PORT=str(sink.port), SMTP_SECURITY='none')
+
+    from api.index import app
+    from api import csv_handler
+    from api.email_service import check_and_send_reminders
+
+    rng = random.Random(args.seed + 1)
+    results = {}
+
+    start = time.perf_counter()
+    csv_handler.get_reminders_by_user_id(user_ids[0])
+    results['cold_load'] = summarize([time.perf_counter() - start], items=args.rows)
+
+    future = datetime.now() + timedelta(days=3650)
+    results['add_reminder'] = summarize(timed(
+        lambda i: csv_handler.add_reminder(rng.choice(user_ids), f'Added {i}', 'benchmark', future, None),
+        args.samples))
+    results['get_reminders_by_user_id'] = summarize(timed(
+        lambda i: csv_handler.get_reminders_by_user_id(rng.choice(user_ids)), args.samples))
+    results['update_reminder'] = summarize(timed(
+        lambda i: csv_handler.update_reminder(rng.choice(reminder_ids[due:] or reminder_ids), title=f'Updated {i}'),
+        args.samples))
+
+    import_runs = max(1, args.samples // 20)
+    results['import_csv'] = summarize(timed(
+        lambda i: csv_handler.import_reminders_csv(user_ids[i % users], io.StringIO(import_csv_text(args.import_rows, i))),
+        import_runs), items=import_runs * args.import_rows)
+
+    client = app.test_client()
+    response = client.post('/login', data={'email': 'user0@bench.local', 'password': PASSWORD})
+    assert response.status_code == 302, 'benchmark login failed'
+    page_runs = max(1, args.samples // 10)
+    results['export_csv'] = summarize(timed(lambda i: client.get('/export_reminders').get_data(), page_runs))
+    results['dashboard'] = summarize(timed(lambda i: client.get('/dashboard').get_data(), page_runs))
+
+    results['dispatch_tick'] = summarize(timed(lambda i: check_and_send_reminders(app), 1), items=due)
+    results['dispatch_tick']['messages_received'] = sink.received
+    sink.stop()
+
+    return {
+        'backend': os.environ['STORAGE_BACKEND'],
+        'rows': args.rows,
+        'users': users,
+        'due': due,
+        'setup_s': round(setup_s, 3),
+        'peak_rss_bytes': peak_rss_bytes(),
+        'results': results,
+    }
+
+
+# Driver
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '') if commit else None
+    except OSError:
+        return None
+
+
+def spawn(args, backend, rows):
+    with tempfile.TemporaryDirectory(prefix='reminder-bench-') as data_dir:
+        result_file = os.path.join(data_dir, 'result.json')
+        env = dict(os.environ, DATA_DIR=data_dir, STORAGE_BACKEND=backend, VERCEL='1',
+                   SMTP_RATE_PER_MINUTE='0', SMTP_RATE_PER_DAY='0', LOG_LEVEL='WARNING')
+        env.pop('SQLITE_DB', None)
+        env.pop('OUTBOX_DB', None)
+        env.pop('LEASE_DB', None)
+        for name in ('SECRET_KEY', 'MAIL_USERNAME', 'MAIL_PASSWORD', 'MAIL_DEFAULT_SENDER',
+                     'SYSTEM_SENDER_EMAIL', 'SYSTEM_APP_PASSWORD'):
+            env.setdefault(name, 'benchmark')
+        command = [sys.executable, os.path.abspath(__file__), '--child', '--result-file', result_file,
+                   '--rows', str(rows), '--samples', str(args.samples), '--due', str(args.due),
+                   '--reminders-per-user', str(args.reminders_per_user), '--senders', str(args.senders),
+                   '--import-rows', str(args.import_rows), '--seed', str(args.seed)]
+        output = None if args.verbose else subprocess.DEVNULL
+        subprocess.run(command, env=env, stdout=output, stderr=output if output is None else subprocess.PIPE, check=True)
+        with open(result_file, encoding='utf-8') as f:
+            return json.load(f)
+
+
+def print_record(record):
+    rss = record['peak_rss_bytes']
+    rss_text = f"{rss / 2**20:.1f} MiB" if rss else 'n/a'
+    print(f"\n📋 {record['backend']} backend, {record['rows']} reminders, {record['users']} users"
+          f" (setup {record['setup_s']}s, peak RSS {rss_text})")
+    print(f"{'operation':<26}{'count':>7}{'items/s':>14}{'p50 ms':>11}{'p99 ms':>11}")
+    for name, stats in record['results'].items():
+        print(f"{name:<26}{stats['count']:>7}{stats['throughput_per_s'] or 0:>14.1f}{stats['p50_ms']:>11.3f}{stats['p99_ms']:>11.3f}")
+
+
+def compare(record, baseline_path):
+    """Print p50 and throughput changes against the latest matching record of a JSON-lines file"""
+    baseline = None
+    with open(baseline_path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            candidate = json.loads(line)
+            if candidate['backend'] == record['backend'] and candidate['rows'] == record['rows']:
+                baseline = candidate
+    if baseline is None:
+        print(f"⚠️ No {record['backend']}/{record['rows']} baseline in {baseline_path}")
+        return
+    print(f"🔍 Against {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for name, stats in record['results'].items():
+        old = baseline['results'].get(name)
+        if not old or not old['p50_ms'] or not old['throughput_per_s'] or not stats['throughput_per_s']:
+            continue
+        print(f"  {name:<24} p50 x{stats['p50_ms'] / old['p50_ms']:.2f}  throughput x{stats['throughput_per_s'] / old['throughput_per_s']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the storage and dispatch hot paths on synthetic data')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000], help='reminder table sizes to run')
+    parser.add_argument('--backend', nargs='+', default=['csv'], choices=['csv', 'sqlite'])
+    parser.add_argument('--samples', type=int, default=200, help='calls timed per single-row operation')
+    parser.add_argument('--due', type=int, default=1000, help='reminders due in the dispatcher tick')
+    parser.add_argument('--reminders-per-user', type=int, default=100)
+    parser.add_argument('--senders', type=int, default=50, help='distinct sender accounts')
+    parser.add_argument('--import-rows', type=int, default=1000, help='rows per imported CSV file')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='append results to this JSON-lines file')
+    parser.add_argument('--compare', help='JSON-lines file with earlier results to compare against')
+    parser.add_argument('--verbose', action='store_true', help="show the app's own output")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.rows = args.rows[0]
+        record = run_child(args)
+        with open(args.result_file, 'w', encoding='utf-8') as f:
+            json.dump(record, f)
+        return
+
+    commit = git_commit()
+    for backend in args.backend:
+        for rows in args.rows:
+            print(f"🔄 Benchmarking {backend} backend with {rows} reminders...")
+            try:
+                record = spawn(args, backend, rows)
+            except subprocess.CalledProcessError as e:
+                print(f"❌ Benchmark run failed: {(e.stderr or b'').decode(errors='replace')[-2000:]}")
+                sys.exit(1)
+            record.update(commit=commit, timestamp=datetime.now().isoformat(timespec='seconds'),
+                          python=platform.python_version(), platform=platform.platform(), samples=args.samples)
+            print_record(record)
+            if args.compare:
+                compare(record, args.compare)
+            if args.output:
+                with open(args.output, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record) + '\n')
+    if args.output:
+        print(f"✅ Results appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.smtp_sink import SMTPSink
+
+# Delivery load generator.
+#
+# Fills a throwaway DATA_DIR with reminders whose reminder_time is spread over
+# the next --spread seconds, points the app at an in-process SMTP sink
+# (api/smtp_sink.py, optionally injecting latency, errors and disconnects) and
+# runs dispatcher ticks every --interval seconds until every reminder is
+# delivered or dead-lettered. Reports messages/sec and the end-to-end lag
+# from reminder_time to the message reaching the sink.
+#
+#   python scripts/load_generator.py --reminders 5000 --senders 50 --latency 0.02 --error-rate 0.05
+#   python scripts/load_generator.py --mode async --reminders 20000 --json
+
+SUBJECT = re.compile(rb'^Subject: Reminder: Load (\d+)\r?$', re.MULTILINE)
+
+
+def write_data(data_dir, reminders, users, senders, spread):
+    """Write users.csv and reminders.csv; returns the reminder_time (epoch) of each reminder"""
+    from api.records import USER_FIELDS, REMINDER_FIELDS, TIME_FORMAT
+
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    with open(os.path.join(data_dir, 'users.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(USER_FIELDS)
+        for i, user_id in enumerate(user_ids):
+            writer.writerow([user_id, f'user{i}@load.local', '', 'True', '', '', '', '', '',
+                             f'sender{i % senders}@load.local', 'app-password'])
+
+    start = datetime.now().replace(microsecond=0) + timedelta(seconds=1)
+    due_at = []
+    with open(os.path.join(data_dir, 'reminders.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(REMINDER_FIELDS)
+        for i in range(reminders):
+            when = start + timedelta(seconds=int(spread * i / reminders))
+            due_at.append(when.timestamp())
+            writer.writerow([str(uuid.uuid4()), user_ids[i % users], f'Load {i}', 'Load generator reminder',
+                             when.strftime(TIME_FORMAT), '', 'False'])
+    return due_at
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] if ordered else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive the reminder dispatcher against a local SMTP sink')
+    parser.add_argument('--reminders', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--senders', type=int, default=50, help='distinct sender accounts')
+    parser.add_argument('--spread', type=float, default=10.0, help='seconds over which reminders fall due (0: all at once, for peak throughput)')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between dispatcher ticks')
+    parser.add_argument('--timeout', type=float, default=300.0)
+    parser.add_argument('--mode', choices=['threads', 'async'], default='threads', help='EMAIL_DELIVERY_MODE')
+    parser.add_argument('--backend', choices=['csv', 'sqlite'], default='csv')
+    parser.add_argument('--latency', type=float, default=0.0, help='sink delay before each DATA reply (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of messages rejected with 451')
+    parser.add_argument('--disconnect-rate', type=float, default=0.0, help='share of messages answered by hanging up')
+    parser.add_argument('--retry-backoff', type=int, default=1, help='OUTBOX_BACKOFF_BASE for the run (s)')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    delivered = {}  # reminder number -> first delivery time
+    duplicates = [0]
+
+    def on_message(received_at, mail_from, rcpt_tos, data):
+        match = SUBJECT.search(data)
+        if match is None:
+            return
+        number = int(match.group(1))
+        if number in delivered:
+            duplicates[0] += 1
+        else:
+            delivered[number] = received_at
+
+    sink = SMTPSink(latency=args.latency, error_rate=args.error_rate, disconnect_rate=args.disconnect_rate,
+                    seed=args.seed, on_message=on_message).start()
+
+    data_dir = tempfile.mkdtemp(prefix='reminder-load-')
+    os.environ.update(
+        DATA_DIR=data_dir, STORAGE_BACKEND=args.backend, VERCEL='1', EMAIL_DELIVERY_MODE=args.mode,
+        SMTP_HOST=sink.host, SMTP_PORT=str(sink.port), SMTP_SECURITY='none',
+        SMTP_RATE_PER_MINUTE='0', SMTP_RATE_PER_DAY='0', LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'),
+        OUTBOX_BACKOFF_BASE=str(args.retry_backoff), OUTBOX_BACKOFF_MAX=str(max(args.retry_backoff * 32, 1)))
+    for name in ('SQLITE_DB', 'OUTBOX_DB', 'LEASE_DB'):
+        os.environ.pop(name, None)
+    for name in ('SECRET_KEY', 'MAIL_USERNAME', 'MAIL_PASSWORD', 'MAIL_DEFAULT_SENDER',
+                 'SYSTEM_SENDER_EMAIL', 'SYSTEM_APP_PASSWORD'):
+        os.environ.setdefault(name, 'load-generator')
+
+    due_at = write_data(data_dir, args.reminders, max(1, args.users), max(1, args.senders), args.spread)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from api.index import app
+    from api import outbox
+    from api.email_service import check_and_send_reminders
+
+    print(f"🔄 Dispatching {args.reminders} reminders due over {args.spread:.0f}s to {sink.host}:{sink.port} "
+          f"({args.mode}, {args.backend})", file=sys.stderr)
+    started = time.time()
+    ticks = 0
+    tick_seconds = []
+    dead = 0
+    while time.time() - started < args.timeout:
+        tick_start = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            check_and_send_reminders(app)
+        tick_seconds.append(time.time() - tick_start)
+        ticks += 1
+        dead = outbox.stats()[outbox.DEAD]
+        if len(delivered) + dead >= args.reminders:
+            break
+        time.sleep(max(0.0, tick_start + args.interval - time.time()))
+    sink.stop()
+
+    lags = sorted(received_at - due_at[number] for number, received_at in delivered.items())
+    first_due = min(due_at) if due_at else started
+    last_delivery = max(delivered.values()) if delivered else time.time()
+    window = max(last_delivery - max(first_due, started), 1e-9)
+    report = {
+        'reminders': args.reminders,
+        'delivered': len(delivered),
+        'dead_lettered': dead,
+        'undelivered': args.reminders - len(delivered) - dead,
+        'duplicates': duplicates[0],
+        'mode': args.mode,
+        'backend': args.backend,
+        'senders': args.senders,
+        'ticks': ticks,
+        'tick_p50_s': round(percentile(sorted(tick_seconds), 0.50) or 0, 4),
+        'tick_max_s': round(max(tick_seconds, default=0), 4),
+        'messages_per_s': round(len(delivered) / window, 2),
+        'lag_p50_s': round(percentile(lags, 0.50), 3) if lags else None,
+        'lag_p99_s': round(percentile(lags, 0.99), 3) if lags else None,
+        'lag_max_s': round(lags[-1], 3) if lags else None,
+        'sink': sink.stats(),
+    }
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"✅ Delivered {report['delivered']}/{args.reminders} in {ticks} ticks "
+              f"({report['dead_lettered']} dead-lettered, {report['undelivered']} undelivered, {report['duplicates']} duplicates)")
+        print(f"📋 Throughput: {report['messages_per_s']} messages/s")
+        print(f"📋 Lag from reminder_time: p50 {report['lag_p50_s']}s, p99 {report['lag_p99_s']}s, max {report['lag_max_s']}s")
+        print(f"📋 Ticks: p50 {report['tick_p50_s']}s, max {report['tick_max_s']}s")
+        print(f"📋 Sink: {report['sink']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from api.storage import CSVStorage, SQLiteStorage, SQLITE_DB, migrate_csv_to_sqlite
+
+# One-shot migration of data/users.csv and data/reminders.csv into the SQLite backend.
+# Afterwards run the app with STORAGE_BACKEND=sqlite.
+
+if __name__ == "__main__":
+    db_path = sys.argv[1] if len(sys.argv) > 1 else SQLITE_DB
+    target = SQLiteStorage(db_path, migrate_from_csv=False)
+    users, reminders = migrate_csv_to_sqlite(CSVStorage(), target)
+    print(f"✅ Migrated {users} users and {reminders} reminders into {db_path}")
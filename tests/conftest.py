@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+# Settings are read at import time, so point every data file at a throwaway
+# directory before anything from api/ is imported.
+os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='reminder-tests-')
+for name in ('SQLITE_DB', 'OUTBOX_DB', 'LEASE_DB'):
+    os.environ.pop(name, None)
+os.environ.update(VERCEL='1', LOG_LEVEL='WARNING', SMTP_RATE_PER_MINUTE='0', SMTP_RATE_PER_DAY='0')
+for name in ('SECRET_KEY', 'MAIL_USERNAME', 'MAIL_PASSWORD', 'MAIL_DEFAULT_SENDER',
+             'SYSTEM_SENDER_EMAIL', 'SYSTEM_APP_PASSWORD'):
+    os.environ.setdefault(name, 'test')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Reminder ids handed to SMTP, instead of sending them"""
+    from api import email_service
+
+    sent = []
+    monkeypatch.setattr(email_service, 'send_reminder_message',
+                        lambda reminder, recipient_email, reminder_time, user: sent.append(reminder.id))
+    return sent
+
+
+@pytest.fixture
+def make_reminder():
+    """make_reminder(credentials=True, due=timedelta) -> id of a new reminder for a new user"""
+    from api.csv_handler import add_user, add_reminder, update_user_email_credentials
+
+    def make(credentials=True, due=timedelta(minutes=-1)):
+        user_id = add_user(f'{uuid.uuid4()}@example.com', 'password')
+        if credentials:
+            update_user_email_credentials(user_id, 'sender@example.com', 'app-password')
+        reminder_time = (datetime.now() + due).replace(microsecond=0)
+        return add_reminder(user_id, 'Test', 'Test reminder', reminder_time, '')
+    return make
+
+
+@pytest.fixture
+def dispatch():
+    """Run one dispatcher tick without the lease"""
+    from api import email_service
+
+    def run():
+        claims = []
+        email_service.dispatch_due_reminders(datetime.now(), claims)
+        email_service.release_claims(claims)
+        return True
+    return run
@@ -0,0 +1,51 @@
+import uuid
+from datetime import datetime, timedelta
+
+from api import email_service, outbox
+from api.csv_handler import add_reminder, get_reminder_by_id, mark_reminders_completed, update_user_email_credentials
+
+
+def test_due_reminder_is_sent_once(sent, make_reminder, dispatch):
+    reminder_id = make_reminder()
+    dispatch()
+    dispatch()
+    assert sent.count(reminder_id) == 1
+    assert get_reminder_by_id(reminder_id).is_completed
+
+
+def test_claim_racing_a_completion_does_not_resend(sent, make_reminder, dispatch, monkeypatch):
+    reminder_id = make_reminder()
+    claim = email_service.claim_reminder
+
+    def claim_after_other_dispatcher(claimed_id):
+        # Another dispatcher sends and records the reminder between our read and our claim
+        if claimed_id == reminder_id:
+            outbox.record_results([], [reminder_id], {})
+            mark_reminders_completed([reminder_id])
+        return claim(claimed_id)
+
+    monkeypatch.setattr(email_service, 'claim_reminder', claim_after_other_dispatcher)
+    dispatch()
+    assert reminder_id not in sent
+
+
+def test_missing_credentials_are_retried_once_they_are_set(sent, make_reminder, dispatch, monkeypatch):
+    monkeypatch.setattr(outbox, 'OUTBOX_BACKOFF_BASE', 0)
+    reminder_id = make_reminder(credentials=False)
+    dispatch()
+    assert reminder_id not in sent
+    assert reminder_id in outbox.ids_with_status([reminder_id], outbox.QUEUED)
+    attempts = outbox._conn().execute("SELECT attempts FROM outbox WHERE reminder_id = ?", (reminder_id,)).fetchone()[0]
+    assert attempts == 0
+
+    update_user_email_credentials(get_reminder_by_id(reminder_id).user_id, 'sender@example.com', 'app-password')
+    dispatch()
+    assert sent.count(reminder_id) == 1
+
+
+def test_unknown_user_is_dead_lettered_without_retries(sent, dispatch):
+    reminder_id = add_reminder(str(uuid.uuid4()), 'Orphan', '', datetime.now().replace(microsecond=0) - timedelta(minutes=1), '')
+    dispatch()
+    row = next(row for row in outbox.dead_letters(limit=1000) if row['reminder_id'] == reminder_id)
+    assert row['attempts'] == 1 and row['last_error'] == 'user not found'
+    assert reminder_id not in sent
@@ -0,0 +1,16 @@
+import re
+from datetime import datetime
+
+from api.email_templates import render_message
+
+BARE_LF = re.compile(rb'(?<!\r)\n')
+
+
+def test_long_non_ascii_subject_folds_with_crlf():
+    title = 'Überprüfung der Jahresabrechnung für das Geschäftsjahr – bitte bis Freitag erledigen ✅ ' * 3
+    message = render_message('reminder', 'sender@example.com', 'to@example.com', title=title,
+                             description='Beschreibung', reminder_time=datetime(2030, 1, 1, 9, 30))
+    headers = message.split(b'\r\n\r\n', 1)[0]
+    assert b'\r\n ' in headers  # the subject was folded
+    assert not BARE_LF.search(message)
+    assert all(len(line) <= 998 for line in message.split(b'\r\n'))
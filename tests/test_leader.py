@@ -0,0 +1,39 @@
+import threading
+import uuid
+
+from api.leader import acquire_lease, release_lease, claim_reminder, release_claims
+
+
+def test_lease_is_exclusive_between_threads():
+    name = f'lease-{uuid.uuid4()}'
+    first = acquire_lease(name)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(acquire_lease(name)))
+    thread.start()
+    thread.join()
+    assert first
+    assert results == [None]
+    assert acquire_lease(name) is None
+
+
+def test_release_only_by_own_token():
+    name = f'lease-{uuid.uuid4()}'
+    holder = acquire_lease(name, ttl=0)
+    # Expired and taken over: the first holder's release must not drop the new lease
+    second = acquire_lease(name)
+    assert second and second != holder
+    release_lease(name, holder)
+    assert acquire_lease(name) is None
+    release_lease(name, second)
+    assert acquire_lease(name)
+
+
+def test_claim_is_exclusive_until_released():
+    reminder_id = str(uuid.uuid4())
+    token = claim_reminder(reminder_id)
+    assert token
+    assert claim_reminder(reminder_id) is None
+    release_claims([(reminder_id, 'someone-else')])
+    assert claim_reminder(reminder_id) is None
+    release_claims([(reminder_id, token)])
+    assert claim_reminder(reminder_id)
@@ -0,0 +1,28 @@
+import os
+import time
+
+import pytest
+
+from api.locking import FileRWLock
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork()')
+def test_write_lock_excludes_a_forked_child(tmp_path):
+    lock = FileRWLock(str(tmp_path / 'table.lock'))
+    with lock.write():
+        pass  # the descriptor is open before the fork
+    ready_r, ready_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            with lock.write():
+                os.write(ready_w, b'1')
+                time.sleep(0.5)
+        finally:
+            os._exit(0)
+    os.read(ready_r, 1)
+    started = time.time()
+    with lock.write():
+        waited = time.time() - started
+    os.waitpid(pid, 0)
+    assert waited >= 0.3
@@ -0,0 +1,28 @@
+import uuid
+from datetime import datetime, timedelta
+
+from api import metrics
+from api.csv_handler import add_reminder
+
+
+def gauge(name):
+    return metrics._values.get((name, ()))
+
+
+def test_scheduler_lag_ignores_dead_letters(monkeypatch, make_reminder, dispatch, sent):
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', True)
+    dispatch()  # settle anything earlier tests left ready
+
+    # A reminder of a deleted user, due a day ago, is dead-lettered on its first tick
+    add_reminder(str(uuid.uuid4()), 'Orphan', '', datetime.now().replace(microsecond=0) - timedelta(days=1), '')
+    dispatch()
+    due_before = metrics._values.get(('reminders_due_total', ()), 0)
+    dispatch()
+    assert gauge('scheduler_lag_seconds') == 0
+    assert metrics._values.get(('reminders_due_total', ()), 0) == due_before
+
+    reminder_id = make_reminder(due=timedelta(minutes=-10))
+    dispatch()
+    assert reminder_id in sent
+    assert 590 <= gauge('scheduler_lag_seconds') <= 660
+    assert metrics._values[('reminders_due_total', ())] == due_before + 1
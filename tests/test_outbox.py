@@ -0,0 +1,62 @@
+import time
+import uuid
+from types import SimpleNamespace
+
+from api import outbox
+
+
+def reminder(reminder_time=1700000000.0):
+    return SimpleNamespace(id=str(uuid.uuid4()), reminder_time=reminder_time)
+
+
+def entry(reminder_id):
+    return next(row for row in outbox._conn().execute("SELECT * FROM outbox WHERE reminder_id = ?", (reminder_id,)))
+
+
+def test_enqueue_writes_each_reminder_once():
+    item = reminder()
+    assert outbox.enqueue([item]) == [item.id]
+    assert outbox.enqueue([item]) == []
+    assert item.id in {row['reminder_id'] for row in outbox.ready()}
+
+
+def test_failures_back_off_then_dead_letter():
+    item = reminder()
+    outbox.enqueue([item])
+    for attempt in range(1, outbox.OUTBOX_MAX_ATTEMPTS):
+        retrying, dead = outbox.record_results([dict(entry(item.id))], [], {item.id: 'boom'})
+        assert (retrying, dead) == (1, 0)
+        row = entry(item.id)
+        assert row['attempts'] == attempt
+        assert row['next_attempt_at'] >= time.time() + outbox.backoff_delay(attempt) - 5
+        assert item.id not in {row['reminder_id'] for row in outbox.ready()}
+    assert outbox.record_results([dict(entry(item.id))], [], {item.id: 'boom'}) == (0, 1)
+    assert entry(item.id)['status'] == outbox.DEAD
+
+
+def test_permanent_errors_dead_letter_at_once():
+    item = reminder()
+    outbox.enqueue([item])
+    assert outbox.record_results([dict(entry(item.id))], [], {}, permanent={item.id: 'user not found'}) == (0, 1)
+    row = entry(item.id)
+    assert (row['status'], row['attempts'], row['last_error']) == (outbox.DEAD, 1, 'user not found')
+    # Still due in storage, but not written again on later ticks
+    assert outbox.enqueue([item]) == []
+
+
+def test_rescheduling_requeues_a_dead_entry():
+    item = reminder()
+    outbox.enqueue([item])
+    outbox.record_results([dict(entry(item.id))], [], {}, permanent={item.id: 'email credentials not set'})
+    item.reminder_time += 3600
+    assert outbox.enqueue([item]) == [item.id]
+    row = entry(item.id)
+    assert (row['status'], row['attempts']) == (outbox.QUEUED, 0)
+
+
+def test_deferred_entries_keep_their_attempts():
+    item = reminder()
+    outbox.enqueue([item])
+    outbox.record_results([dict(entry(item.id))], [], {}, deferred={item.id: 30})
+    row = entry(item.id)
+    assert row['attempts'] == 0 and row['next_attempt_at'] > time.time() + 25
@@ -0,0 +1,82 @@
+import json
+import threading
+
+from api.records import REMINDER_FIELDS
+from api.reminder_log import ReminderLog
+
+
+def row(reminder_id, title='Call Bob', user_id='user-1'):
+    return {'id': reminder_id, 'user_id': user_id, 'title': title, 'description': '',
+            'reminder_time': '2030-01-01 09:00:00', 'recipient_email': 'bob@example.com', 'is_completed': 'False'}
+
+
+def open_log(tmp_path):
+    return ReminderLog(str(tmp_path / 'reminders.csv'), REMINDER_FIELDS)
+
+
+def test_replay_applies_inserts_updates_and_deletes(tmp_path):
+    writer = open_log(tmp_path)
+    writer.insert(row('a'))
+    writer.insert(row('b'))
+    writer.insert(row('c'))
+    assert writer.update('a', {'title': 'Call Alice', 'is_completed': 'True'})
+    assert writer.delete('b')
+    assert not writer.update('b', {'title': 'gone'})
+
+    reader = open_log(tmp_path)
+    rows = reader.rows()
+    assert sorted(rows) == ['a', 'c']
+    assert rows['a'].title == 'Call Alice'
+    assert rows['a'].is_completed is True
+    assert rows['c'].title == 'Call Bob'
+    # The mmap lookup replays the log without loading the table
+    assert open_log(tmp_path).get('a').title == 'Call Alice'
+    assert open_log(tmp_path).get('b') is None
+
+
+def test_compaction_keeps_appends_made_while_it_runs(tmp_path):
+    writer = open_log(tmp_path)
+    compactor = open_log(tmp_path)
+    writer.insert(row('seed'))
+    done = threading.Event()
+
+    def append_rows():
+        for i in range(200):
+            writer.insert(row(f'r{i}'))
+            if i % 10 == 0:
+                writer.update(f'r{i}', {'title': f'updated {i}'})
+        done.set()
+
+    thread = threading.Thread(target=append_rows)
+    thread.start()
+    compactions = 0
+    while not done.is_set() or compactions == 0:
+        compactor.compact()
+        compactions += 1
+    thread.join()
+    compactor.compact()
+
+    assert not (tmp_path / 'reminders.log.compacting').exists()
+    assert not (tmp_path / 'reminders.log').exists()
+    rows = open_log(tmp_path).rows()
+    assert len(rows) == 201
+    assert rows['r10'].title == 'updated 10'
+    assert rows['r11'].title == 'Call Bob'
+
+
+def test_corrupt_and_torn_records_are_skipped(tmp_path):
+    open_log(tmp_path).insert(row('a'))
+    torn = json.dumps({'op': 'insert', 'id': 'torn', 'row': row('torn')})
+    with open(tmp_path / 'reminders.log', 'ab') as f:
+        f.write(b'not json\n')
+        f.write(torn[:len(torn) // 2].encode('utf-8'))
+
+    reader = open_log(tmp_path)
+    assert sorted(reader.rows()) == ['a']
+    assert reader.get('torn') is None
+
+    # The next append terminates the torn record instead of being swallowed by it
+    reader.insert(row('b'))
+    assert sorted(open_log(tmp_path).rows()) == ['a', 'b']
+    reader.compact()
+    assert sorted(open_log(tmp_path).rows()) == ['a', 'b']
@@ -0,0 +1,44 @@
+import time
+from datetime import datetime, timedelta
+
+from api import reminder_timer
+from api.csv_handler import get_reminder_by_id
+
+
+def test_wake_time_ignores_parked_reminders(make_reminder, dispatch, sent):
+    stuck = make_reminder(credentials=False)
+    dispatch()
+    later = make_reminder(due=timedelta(hours=1))
+    wake_at = reminder_timer.next_wake_time()
+    assert wake_at is not None and wake_at > datetime.now()
+    assert wake_at <= get_reminder_by_id(later).due_at
+    assert not get_reminder_by_id(stuck).is_completed
+
+
+def test_stuck_reminder_does_not_delay_a_later_one(make_reminder, dispatch, sent, monkeypatch):
+    monkeypatch.setattr(reminder_timer, 'TIMER_RETRY_DELAY', 30)
+    make_reminder(credentials=False)
+    # Created before the timer starts, so it is not announced to it in-process
+    later = make_reminder(due=timedelta(seconds=2))
+    timer = reminder_timer.ReminderTimer(dispatch)
+    timer.start()
+    try:
+        deadline = time.time() + 8
+        while later not in sent and time.time() < deadline:
+            time.sleep(0.1)
+    finally:
+        timer.stop()
+    assert later in sent
+
+
+def test_waits_when_the_lease_is_held_elsewhere(make_reminder, monkeypatch):
+    monkeypatch.setattr(reminder_timer, 'TIMER_RETRY_DELAY', 30)
+    make_reminder()
+    calls = []
+    timer = reminder_timer.ReminderTimer(lambda: calls.append(time.time()) or False)
+    timer.start()
+    try:
+        time.sleep(1)
+    finally:
+        timer.stop()
+    assert len(calls) == 1